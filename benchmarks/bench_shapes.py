@@ -0,0 +1,194 @@
+"""
+asv-benchmarks of the shape-intersections and interval extraction on synthetic orbits.
+
+Lengths larger than BRONI_BENCH_MAX_SAMPLES (environment, default 10^7) are skipped.
+"""
+
+import os
+
+import numpy as np
+from astropy.units import km
+
+import broni
+from broni.shapes.primitives import Cuboid, Sphere
+from broni.shapes.callback import SphericalBoundary, Sheath, NestedBoundaries
+from broni.shapes.collection import ShapeCollection
+from broni.shapes.mesh import MeshShape
+
+from .orbits import R_EARTH, ORBITS, kepler
+
+LENGTHS = [10 ** 3, 10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8]
+MAX_SAMPLES = int(os.environ.get('BRONI_BENCH_MAX_SAMPLES', 10 ** 7))
+
+
+def magnetopause(lon, lat, r0=10.0, alpha=0.58, **kwargs):
+    """Shue et al. (1997)-shaped magnetopause, radius in earth-radii."""
+    cos_theta = np.asarray(np.cos(lat) * np.cos(lon))
+    return r0 * (2 / (1 + np.maximum(cos_theta, -0.99))) ** alpha, lon, lat
+
+
+def bow_shock(lon, lat, r0=13.0, eccentricity=0.8, **kwargs):
+    """Conic bow-shock, radius in earth-radii."""
+    cos_theta = np.asarray(np.cos(lat) * np.cos(lon))
+    return r0 * (1 + eccentricity) / (1 + eccentricity * np.maximum(cos_theta, -0.95)), lon, lat
+
+
+def sphere_mesh(count, radius):
+    lat = np.linspace(-np.pi / 2, np.pi / 2, count + 1)[1:-1]
+    lon = np.linspace(0, 2 * np.pi, count, endpoint=False)
+    lat, lon = np.meshgrid(lat, lon, indexing='ij')
+    vertices = np.stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)), axis=-1).reshape(-1, 3)
+    vertices = np.vstack((vertices, [[0, 0, -1], [0, 0, 1]])) * radius
+    south, north = len(vertices) - 2, len(vertices) - 1
+
+    i, j = np.meshgrid(np.arange(count - 2), np.arange(count), indexing='ij')
+    i, j = i.ravel(), j.ravel()
+    quads = np.stack((i * count + j, i * count + (j + 1) % count,
+                      (i + 1) * count + (j + 1) % count, (i + 1) * count + j), axis=1)
+    j = np.arange(count)
+    faces = np.concatenate((quads[:, [0, 1, 2]], quads[:, [0, 2, 3]],
+                            np.stack((np.full(count, south), (j + 1) % count, j), axis=1),
+                            np.stack((np.full(count, north), (count - 2) * count + j,
+                                      (count - 2) * count + (j + 1) % count), axis=1)))
+    return vertices * km, faces
+
+
+def collection():
+    # regions scattered around the mms-orbit
+    rng = np.random.default_rng(0)
+    centers = kepler(1000, *ORBITS['mms'], cadence=800)[0] + rng.normal(0, 3 * R_EARTH, (1000, 3))
+    return ShapeCollection([Sphere(*c * km, R_EARTH * km) for c in centers])
+
+
+# factories, only the shapes of a benchmark are built (the mesh and the collection take a while)
+SHAPES = {
+    'sphere': lambda: Sphere(*(22 * R_EARTH, 0, 0, 5 * R_EARTH) * km),
+    'cuboid': lambda: Cuboid(*(5 * R_EARTH, -5 * R_EARTH, -5 * R_EARTH, 15 * R_EARTH, 5 * R_EARTH, 5 * R_EARTH) * km),
+    'boundary': lambda: SphericalBoundary(magnetopause, -1 * R_EARTH * km, 1 * R_EARTH * km),
+    'sheath': lambda: Sheath(magnetopause, bow_shock),
+    'nested': lambda: NestedBoundaries(magnetopause, bow_shock, region=1),
+    'collection': collection,
+    'mesh': lambda: MeshShape(*sphere_mesh(200, 8 * R_EARTH)),
+}
+
+
+class _Orbit:
+    """
+    Keeps the orbit-arrays of the setup, the trajectory itself is created in the benchmarked function so that
+    derived data (spherical coordinates) is not cached between runs.
+    """
+    orbit = 'mms'
+
+    def setup(self, n, *args):
+        if n > MAX_SAMPLES:
+            raise NotImplementedError()
+        self.xyz, self.time = kepler(n, *ORBITS[self.orbit], cadence=4.5)
+        self.xyz = self.xyz * km
+
+    def trajectory(self):
+        return broni.Trajectory(self.xyz[:, 0], self.xyz[:, 1], self.xyz[:, 2], self.time, 'gse')
+
+
+class Shapes(_Orbit):
+    params = (LENGTHS, list(SHAPES.keys()))
+    param_names = ['samples', 'shape']
+    timeout = 600
+
+    def setup(self, n, shape):
+        super().setup(n)
+        self.shape = SHAPES[shape]()
+
+    def time_intersect(self, n, shape):
+        self.shape.intersect(self.trajectory())
+
+    def peakmem_intersect(self, n, shape):
+        self.shape.intersect(self.trajectory())
+
+
+class Precision(_Orbit):
+    """
+    Single precision trajectories (guard='exact') against double precision ones, the spherical coordinates are
+    computed in the setup: only the intersection is measured.
+    """
+    params = (LENGTHS, ['sphere', 'cuboid', 'boundary', 'sheath', 'nested'], ['float64', 'float32'])
+    param_names = ['samples', 'shape', 'dtype']
+    timeout = 600
+
+    def setup(self, n, shape, dtype):
+        super().setup(n)
+        self.shape = SHAPES[shape]()
+        self.warm = broni.Trajectory(self.xyz[:, 0], self.xyz[:, 1], self.xyz[:, 2], self.time, 'gse', dtype=dtype)
+        self.warm._spherical_km()
+
+    def time_intersect(self, n, shape, dtype):
+        self.shape.intersect(self.warm)
+
+    def peakmem_intersect(self, n, shape, dtype):
+        self.shape.intersect(self.warm)
+
+
+class MultiShapeAnd(_Orbit):
+    params = LENGTHS
+    param_names = ['samples']
+    timeout = 600
+
+    def setup(self, n):
+        super().setup(n)
+        self.shapes = [SHAPES[name]() for name in ('cuboid', 'sphere', 'sheath')]
+
+    def time_intervals(self, n):
+        broni.intervals(self.trajectory(), self.shapes)
+
+    def peakmem_intervals(self, n):
+        broni.intervals(self.trajectory(), self.shapes)
+
+    def time_interval_table(self, n):
+        broni.interval_table(self.trajectory(), self.shapes)
+
+    def time_regions(self, n):
+        broni.regions(self.trajectory(), {'sheath': self.shapes[2], 'box': self.shapes[:2]})
+
+    def time_aggregate(self, n):
+        broni.aggregate(self.trajectory(), {'sheath': self.shapes[2], 'box': self.shapes[:2]},
+                        bins=50, extent=[(-30 * R_EARTH, 30 * R_EARTH)] * 3, duration_bins=np.logspace(1, 6, 21))
+
+    def peakmem_aggregate(self, n):
+        broni.aggregate(self.trajectory(), {'sheath': self.shapes[2], 'box': self.shapes[:2]},
+                        bins=50, extent=[(-30 * R_EARTH, 30 * R_EARTH)] * 3, duration_bins=np.logspace(1, 6, 21))
+
+
+class Orbits(_Orbit):
+    params = ([10 ** 3, 10 ** 5, 10 ** 6], list(ORBITS.keys()))
+    param_names = ['samples', 'orbit']
+
+    def setup(self, n, orbit):
+        self.orbit = orbit
+        super().setup(n)
+
+    def time_spherical(self, n, orbit):
+        self.trajectory().r
+
+    def time_sheath(self, n, orbit):
+        Sheath(magnetopause, bow_shock).intersect(self.trajectory())
+
+
+class IndexListToRanges:
+    params = [10 ** 3, 10 ** 5, 10 ** 6]
+    param_names = ['intervals']
+
+    def setup(self, n):
+        # intervals of 1 to 10 points separated by gaps of 1 to 10 points
+        lengths = np.random.default_rng(0).integers(1, 10, (n, 2))
+        starts = np.cumsum(lengths.sum(axis=1)) - lengths[:, 0]
+        self.indices = np.concatenate([np.arange(s, s + l) for s, l in zip(starts, lengths[:, 0])])
+        self.mask = np.zeros(self.indices[-1] + 1, dtype=bool)
+        self.mask[self.indices] = True
+
+    def time_index_list_to_ranges(self, n):
+        broni._index_list_to_ranges(self.indices)
+
+    def peakmem_index_list_to_ranges(self, n):
+        broni._index_list_to_ranges(self.indices)
+
+    def time_mask_to_bounds(self, n):
+        broni._mask_to_bounds(self.mask)
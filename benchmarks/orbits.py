@@ -0,0 +1,58 @@
+"""
+Synthetic Keplerian orbits for offline benchmarks.
+"""
+
+import numpy as np
+from astropy.units import km
+
+import broni
+
+MU_EARTH = 398600.4418  # km^3/s^2
+R_EARTH = 6378.137  # km
+
+# perigee and apogee (earth-radii, geocentric), inclination, right ascension of the ascending node and argument
+# of perigee (degrees)
+ORBITS = {
+    'heo': (4.0, 19.6, 90.0, 0.0, 0.0),
+    'mms': (1.2, 25.0, 28.0, 0.0, 180.0),
+    'themis': (1.16, 11.8, 16.0, 0.0, 180.0),
+}
+
+
+def kepler(n: int, perigee: float, apogee: float, inclination: float, raan: float, argp: float,
+           cadence: float = 60.0, epoch: str = '2020-01-01'):
+    """
+    Returns the positions (km, shape (n, 3)) and times (datetime64[ns]) of n samples with a cadence given in
+    seconds of a Keplerian orbit.
+    """
+    rp, ra = perigee * R_EARTH, apogee * R_EARTH
+    a = (rp + ra) / 2
+    e = (ra - rp) / (ra + rp)
+
+    t = np.arange(n) * cadence
+    m = np.sqrt(MU_EARTH / a ** 3) * t
+
+    # Kepler's equation, Newton iterations
+    ea = m + e * np.sin(m)
+    for _ in range(8):
+        ea -= (ea - e * np.sin(ea) - m) / (1 - e * np.cos(ea))
+
+    # position in the orbital plane, perigee on the x-axis
+    orbital = np.stack((a * (np.cos(ea) - e), a * np.sqrt(1 - e ** 2) * np.sin(ea), np.zeros(n)), axis=1)
+
+    def rot_z(angle):
+        c, s = np.cos(np.radians(angle)), np.sin(np.radians(angle))
+        return np.array(((c, -s, 0), (s, c, 0), (0, 0, 1)))
+
+    def rot_x(angle):
+        c, s = np.cos(np.radians(angle)), np.sin(np.radians(angle))
+        return np.array(((1, 0, 0), (0, c, -s), (0, s, c)))
+
+    rotation = rot_z(raan) @ rot_x(inclination) @ rot_z(argp)
+    time = np.datetime64(epoch, 'ns') + (t * 1e9).astype('timedelta64[ns]')
+    return orbital @ rotation.T, time
+
+
+def trajectory(name: str, n: int, cadence: float = 60.0):
+    xyz, time = kepler(n, *ORBITS[name], cadence=cadence)
+    return broni.Trajectory(xyz[:, 0] * km, xyz[:, 1] * km, xyz[:, 2] * km, time, 'gse')
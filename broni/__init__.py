@@ -4,44 +4,285 @@ __author__ = """Patrick Boettcher"""
 __email__ = 'p@yai.se'
 __version__ = '0.1.0'
 
+import sys
+
 import numpy as np
 
-from astropy.coordinates import cartesian_to_spherical
-from astropy import units
+from collections import Counter
 
-from typing import List, Union
+from datetime import datetime, timezone
+from typing import List, Union, TYPE_CHECKING
 
 from .shapes import Shape
+from . import frames
+from .profiling import stage
+from .units import is_quantity, to_km, quantity
+
+if TYPE_CHECKING:
+    from astropy.units import Quantity
+
+
+def _normalize_time_index(time_index):
+    """
+    Converts a time-index to a np.array. Time-indices containing dates and times (datetime64, datetime-objects,
+    pandas.DatetimeIndex, astropy.time.Time) are converted to datetime64[ns] (UTC), other indices, e.g. numerical
+    timestamps, are kept as they are.
+    """
+    # pandas is only imported if it has already been imported by the caller, else this is no pandas-object
+    pandas = sys.modules.get('pandas')
+    if pandas is not None and isinstance(time_index, pandas.Series):
+        if isinstance(time_index.dtype, pandas.DatetimeTZDtype):
+            time_index = time_index.dt.tz_convert('UTC').dt.tz_localize(None)
+        time_index = time_index.to_numpy()
+    elif pandas is not None and isinstance(time_index, pandas.DatetimeIndex):
+        if time_index.tz is not None:
+            time_index = time_index.tz_convert('UTC').tz_localize(None)
+        time_index = time_index.to_numpy()
+
+    if hasattr(time_index, 'jd1'):  # astropy.time.Time
+        return np.atleast_1d(time_index.utc.to_value('datetime64')).astype('datetime64[ns]')
+
+    time_index = np.asarray(time_index)
+    if time_index.dtype.kind == 'M':
+        return time_index.astype('datetime64[ns]', copy=False)
+
+    if time_index.dtype.kind == 'O' and len(time_index) and isinstance(time_index[0], datetime):
+        return np.array([t.astimezone(timezone.utc).replace(tzinfo=None) if t.tzinfo else t
+                         for t in time_index], dtype='datetime64[ns]')
+
+    return time_index
+
+
+def _normalize_time_value(value, time_index: np.ndarray):
+    """
+    Converts a single time-value to the type of an already normalized time-index.
+    """
+    if time_index.dtype.kind != 'M':
+        return value
+
+    if hasattr(value, 'to_datetime64'):  # pandas.Timestamp
+        return value.to_datetime64().astype('datetime64[ns]')
+
+    if hasattr(value, 'jd1'):  # astropy.time.Time
+        return _normalize_time_index(value)[0]
+
+    if isinstance(value, datetime):
+        return _normalize_time_index([value])[0]
+
+    return np.datetime64(value, 'ns')
+
+
+def _spherical(xyz: np.ndarray):
+    """
+    r, latitude and longitude (longitude in [0, 2pi)) of positions of shape (N, 3), in their precision.
+    """
+    x, y, z = xyz[:, 0], xyz[:, 1], xyz[:, 2]
+    rho = np.hypot(x, y)
+    lon = np.arctan2(y, x)
+    lon[lon < 0] += 2 * np.pi
+    return np.hypot(rho, z), np.arctan2(z, rho), lon
+
+
+# relative width of the guard band in units of the machine epsilon of the trajectory's dtype
+GUARD_BAND_ULPS = 16
 
 
 class Trajectory:
+    """
+    Positions (x, y, z as Quantities or as plain arrays in km) of a spacecraft at the times of time_index.
+
+    Derived data (cartesian positions, spherical coordinates) is computed on first use and cached, internally all
+    computations are done on plain np.arrays in km (astropy is only used to return Quantities).
+
+    With dtype=np.float32 the positions and the derived data are stored in single precision and the shapes
+    compute in single precision, which halves the memory and the memory-bandwidth needed. Points whose result
+    could be affected by the reduced precision (within a guard band around the shape's boundary) are either
+    re-evaluated in double precision (guard='exact', the results are then the same as for a double precision
+    trajectory of the same, rounded positions) or selected (guard='conservative', the results are then a superset).
+    """
+
     def __init__(self,
-                 x: units.quantity.Quantity,
-                 y: units.quantity.Quantity,
-                 z: units.quantity.Quantity,
+                 x: 'Quantity',
+                 y: 'Quantity',
+                 z: 'Quantity',
                  time_index: np.array,
-                 coordinate_system: str):
+                 coordinate_system: str,
+                 dtype: np.dtype = np.float64,
+                 guard: str = 'exact'):
 
         if len(x) != len(y) and len(y) != len(z):
             raise ValueError("x, y and z array must have the same number of elements")
 
+        time_index = _normalize_time_index(time_index)
+
         if len(x) != len(time_index):
             raise ValueError("trajectory data and time list must have the same number of elements")
 
+        self._dtype = np.dtype(dtype)
+        if self._dtype not in (np.float32, np.float64):
+            raise ValueError(f"Unsupported dtype {self._dtype}, use float32 or float64.")
+        if guard not in ('exact', 'conservative'):
+            raise ValueError(f"Unsupported guard '{guard}', use 'exact' or 'conservative'.")
+        self._guard = guard
+
         self._x = x
         self._y = y
         self._z = z
+        self._cartesian = None
+
+        if self._dtype != np.float64:
+            # only keep the converted positions, x, y and z are views on them
+            self._cartesian = np.stack((to_km(x, self._dtype), to_km(y, self._dtype), to_km(z, self._dtype)), axis=1)
+            columns = [self._cartesian[:, i] for i in range(3)]
+            if is_quantity(x):
+                columns = [quantity(column) for column in columns]
+            self._x, self._y, self._z = columns
         self._r = None
         self._lat = None
         self._lon = None
 
         self._time_index = time_index
+        self._time_index_sorted = None
         self.coordinate_system = coordinate_system
 
+        self._frames = {}
+
+        self._parent = None
+        self._slice = None
+
+    @classmethod
+    def _from_cartesian(cls, xyz: np.ndarray, time_index: np.ndarray, coordinate_system: str,
+                        guard: str = 'exact', as_quantity: bool = False):
+        """
+        Trajectory on positions of shape (N, 3) in km, in their precision. x, y and z are views on the columns
+        of xyz (as Quantities with as_quantity), the positions are not copied.
+        """
+        columns = [xyz[:, i] for i in range(3)]
+        if as_quantity:
+            columns = [quantity(column) for column in columns]
+
+        # created as double precision trajectory, which keeps the given columns, the dtype is set afterwards
+        trajectory = cls(*columns, time_index, coordinate_system, guard=guard)
+        trajectory._dtype = xyz.dtype
+        trajectory._cartesian = xyz
+        return trajectory
+
+    def __len__(self):
+        return len(self._time_index)
+
+    def __getitem__(self, index: slice):
+        """
+        Returns a view on a range of this trajectory: x, y, z and the time-index of the view are slices of
+        the arrays of this trajectory (no data is copied). Derived data (cartesian, r, lat, lon) already computed
+        for this trajectory is shared with the view, otherwise the view computes it for its range only.
+        """
+        if not isinstance(index, slice):
+            raise TypeError("Trajectories can only be sliced, use a slice-object as index.")
+
+        view = Trajectory.__new__(Trajectory)
+        view._dtype = self._dtype
+        view._guard = self._guard
+        view._x = self._x[index]
+        view._y = self._y[index]
+        view._z = self._z[index]
+        view._cartesian = None
+        view._r = None
+        view._lat = None
+        view._lon = None
+
+        view._time_index = self._time_index[index]
+        view._time_index_sorted = self._time_index_sorted if index.step is None or index.step > 0 else None
+        view.coordinate_system = self.coordinate_system
+        view._frames = {}
+
+        view._parent = self
+        view._slice = index
+        return view
+
+    def between(self, start=None, stop=None):
+        """
+        Returns a view (see __getitem__) on the trajectory points whose time is within [start, stop].
+        """
+        return self[slice(*self.index_range(start, stop))]
+
     @property
     def time_index(self):
         return self._time_index
 
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def guard(self):
+        return self._guard
+
+    def _guard_band(self, scale, ulps: int = GUARD_BAND_ULPS):
+        """
+        Width of the guard band around a boundary for values of the given magnitude computed in the trajectory's
+        precision (ulps relative to scale), 0 for double precision.
+        """
+        if self._dtype == np.float64:
+            return 0
+        return ulps * np.finfo(self._dtype).eps * scale
+
+    def _subset(self, indices: np.ndarray):
+        """
+        Double precision trajectory of some points, used to re-evaluate the points inside the guard band.
+        """
+        xyz = self._cartesian_km()[indices].astype(np.float64)
+        return Trajectory._from_cartesian(xyz, self._time_index[indices], self.coordinate_system)
+
+    def to(self, coordinate_system: str):
+        """
+        Returns this trajectory transformed to another coordinate system (see broni.frames for the supported
+        ones). The time-index has to contain datetimes.
+
+        The transformed trajectory is cached per coordinate system, views use the transformation of their parent
+        if it has already been computed.
+        """
+        source, target = frames._check_frame(self.coordinate_system), frames._check_frame(coordinate_system)
+        if source == target:
+            return self
+
+        if target not in self._frames:
+            if self._parent is not None and target in self._parent._frames:
+                self._frames[target] = self._parent._frames[target][self._slice]
+            else:
+                if self._time_index.dtype.kind != 'M':
+                    raise ValueError("Coordinate transformations require a time-index containing datetimes.")
+
+                cartesian = self._cartesian_km()
+                with stage('transform', len(self)):
+                    xyz = frames.transform(cartesian, self._time_index, source, target)
+
+                trajectory = Trajectory._from_cartesian(xyz.astype(self._dtype, copy=False), self._time_index,
+                                                        target, self._guard, is_quantity(self._x))
+                trajectory._time_index_sorted = self._time_index_sorted
+                trajectory._frames[source] = self
+                self._frames[target] = trajectory
+
+        return self._frames[target]
+
+    def index_range(self, start=None, stop=None):
+        """
+        Returns the index range [first, last) of the trajectory points whose time is within [start, stop] using a
+        binary search on the time-index, which therefore has to be sorted. start and/or stop can be omitted.
+
+        For datetime-indices start and stop can be given as datetime, datetime64, pandas.Timestamp or
+        astropy.time.Time (or as string in ISO-format).
+        """
+        if self._time_index_sorted is None:
+            self._time_index_sorted = bool(np.all(self._time_index[1:] >= self._time_index[:-1]))
+        if not self._time_index_sorted:
+            raise ValueError("The time-index has to be sorted to select a time-range.")
+
+        first = 0 if start is None else \
+            int(np.searchsorted(self._time_index, _normalize_time_value(start, self._time_index), side='left'))
+        last = len(self._time_index) if stop is None else \
+            int(np.searchsorted(self._time_index, _normalize_time_value(stop, self._time_index), side='right'))
+        return first, max(first, last)
+
     @property
     def x(self):
         return self._x
@@ -56,28 +297,54 @@ class Trajectory:
 
     @property
     def r(self):
-        self._spherical()
-        return self._r
+        return quantity(self._spherical_km()[0], 'km')
 
     @property
     def lat(self):
-        self._spherical()
-        return self._lat
+        return quantity(self._spherical_km()[1], 'rad')
 
     @property
     def lon(self):
-        self._spherical()
-        return self._lon
+        return quantity(self._spherical_km()[2], 'rad')
+
+    def _from_parent(self, *names: str):
+        """
+        Takes derived data from the parent-trajectory (if it has already computed it) for views.
+        Returns True if the data is available.
+        """
+        if getattr(self, names[0]) is not None:
+            return True
+        if self._parent is None or not self._parent._from_parent(*names):
+            return False
+
+        for name in names:
+            setattr(self, name, getattr(self._parent, name)[self._slice])
+        return True
 
     @property
     def cartesian(self):
-        return np.array((self.x,
-                         self.y,
-                         self.z)).T * self.x.unit
+        return quantity(self._cartesian_km(), 'km')
+
+    def _cartesian_km(self):
+        """
+        Positions as plain np.array of shape (N, 3) in km.
+        """
+        if not self._from_parent('_cartesian'):
+            with stage('cartesian', len(self)):
+                self._cartesian = np.stack((to_km(self._x, self._dtype),
+                                            to_km(self._y, self._dtype),
+                                            to_km(self._z, self._dtype)), axis=1)
+        return self._cartesian
 
-    def _spherical(self):
-        if self._r is None:
-            self._r, self._lat, self._lon = cartesian_to_spherical(self._x, self._y, self._z)
+    def _spherical_km(self):
+        """
+        Spherical coordinates r (km), latitude and longitude (radians, longitude in [0, 2pi)) as plain np.arrays.
+        """
+        if not self._from_parent('_r', '_lat', '_lon'):
+            xyz = self._cartesian_km()
+            with stage('spherical', len(self)):
+                self._r, self._lat, self._lon = _spherical(xyz)
+        return self._r, self._lat, self._lon
 
 
 def _listify(v):
@@ -87,17 +354,126 @@ def _listify(v):
         return [v]
 
 
-def _index_list_to_ranges(indices: List[int]):
+def _mask_to_bounds(mask: np.ndarray):
+    """
+    First and last index (inclusive) of each run of True-values in mask.
+    """
+    edges = np.diff(mask.view(np.int8), prepend=np.int8(0), append=np.int8(0))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+
+
+def _join_bounds(starts: np.ndarray, stops: np.ndarray):
+    """
+    Joins the intervals (first and last index, inclusive, sorted) which continue each other, e.g. the intervals
+    found on consecutive chunks of a trajectory.
+    """
+    joined = np.flatnonzero(starts[1:] == stops[:-1] + 1)
+    return np.delete(starts, joined + 1), np.delete(stops, joined)
+
+
+def _index_list_to_bounds(indices: List[int]):
+    """
+    First and last index (inclusive) of each run of consecutive indices.
+    """
+    indices = np.asarray(indices, dtype=np.intp)
     if len(indices) == 0:
-        return []
-    split_idx = np.flatnonzero(np.diff(indices, prepend=indices[0], append=indices[-1]) != 1)
-    bounding_points = np.transpose([split_idx[:-1], split_idx[1:]])
-    return [range(indices[n], indices[m - 1]) for n, m in bounding_points]
-
-
-def intervals(trajectory: Trajectory, shps: Union[List[Shape], Shape]):
-    masks = [shape.intersect(trajectory) for shape in _listify(shps)]
-    if len(masks) == 0:
-        return []
-    ranges = _index_list_to_ranges(np.where(np.logical_and.reduce(masks))[0])
-    return [(trajectory.time_index[r.start], trajectory.time_index[r.stop]) for r in ranges]
+        return indices, indices
+    breaks = np.flatnonzero(np.diff(indices) != 1) + 1
+    return indices[np.concatenate(([0], breaks))], indices[np.concatenate((breaks - 1, [len(indices) - 1]))]
+
+
+def _index_list_to_ranges(indices: List[int]):
+    return [range(start, stop) for start, stop in zip(*_index_list_to_bounds(indices))]
+
+
+class _MaskCache:
+    """
+    Masks of the shape-instances used several times in a set of shape-lists. Only shapes referenced more than
+    once are kept and each mask is dropped after its last use, so that not all masks are held at once.
+    """
+
+    def __init__(self, shape_lists: List[List[Shape]]):
+        self._uses = Counter(id(shape) for shps in shape_lists for shape in shps)
+        self._masks = {}
+
+    def get(self, shape: Shape):
+        return self._masks.get(id(shape))
+
+    def put(self, shape: Shape, mask: np.ndarray):
+        if self._uses[id(shape)] > 1:
+            self._masks[id(shape)] = mask
+
+    def release(self, shps: List[Shape]):
+        """
+        Counts the use of a shape-list (whether its shapes were evaluated or not).
+        """
+        for shape in shps:
+            self._uses[id(shape)] -= 1
+            if self._uses[id(shape)] <= 0:
+                self._masks.pop(id(shape), None)
+
+
+def _intersect_all(trajectory: Trajectory, shps: List[Shape], cache: _MaskCache = None, name: str = None):
+    """
+    Logical-and of the masks of all shapes. Returns None if no shape is given.
+
+    The shapes are identified in the profiling-records by their position in the list, prefixed by name if given.
+
+    Evaluation stops as soon as no point is left. With a cache (a _MaskCache of all shape-lists) the mask of a
+    shape-instance used several times is only computed once.
+    """
+    mask = None
+    for i, shape in enumerate(shps):
+        if mask is not None and not mask.any():
+            break
+
+        shape_mask = cache.get(shape) if cache is not None else None
+        if shape_mask is None:
+            shape_id = f"{name}#{i}" if name is not None else f"#{i}"
+            with stage('intersect', len(trajectory), shape, shape_id) as record:
+                shape_mask = shape.intersect(trajectory)
+                if record is not None:
+                    record.surviving = int(np.count_nonzero(shape_mask))
+            if cache is not None:
+                cache.put(shape, shape_mask)
+
+        mask = np.array(shape_mask, dtype=bool) if mask is None else np.logical_and(mask, shape_mask, out=mask)
+
+    if cache is not None:
+        cache.release(shps)
+    return mask
+
+
+def interval_table(trajectory: Trajectory, shps: Union[List[Shape], Shape], start=None, stop=None):
+    """
+    Same as intervals() but returns the intervals as broni.results.Intervals, a column-oriented result
+    (start/stop indices and times, durations) which can be exported to NumPy or Arrow without building
+    Python objects for each interval. The indices refer to the given trajectory, also if start/stop are used.
+    """
+    first, last = trajectory.index_range(start, stop) if start is not None or stop is not None else (0, None)
+    view = trajectory[first:last] if first != 0 or last is not None else trajectory
+
+    mask = _intersect_all(view, _listify(shps))
+    if mask is None:
+        mask = np.zeros(0, dtype=bool)
+    with stage('intervals', len(mask)) as record:
+        starts, stops = _mask_to_bounds(mask)
+        result = Intervals(trajectory, starts + first, stops + first)
+        if record is not None:
+            record.surviving = len(result)
+    return result
+
+
+def intervals(trajectory: Trajectory, shps: Union[List[Shape], Shape], start=None, stop=None):
+    """
+    Returns the list of (start, stop)-times of the intervals during which the trajectory is inside all the
+    given shapes. With start and/or stop only the trajectory-points within this time-range are considered,
+    the trajectory is not copied for that (see Trajectory.between()).
+    """
+    return interval_table(trajectory, shps, start, stop).to_list()
+
+
+from .results import Intervals  # noqa: E402
+from . import profiling  # noqa: E402, F401
+from .regions import Regions, regions  # noqa: E402, F401
+from .aggregation import Aggregation, aggregate  # noqa: E402, F401
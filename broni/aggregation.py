@@ -0,0 +1,186 @@
+from . import Trajectory, Intervals, _listify, _intersect_all, _MaskCache, _mask_to_bounds, _join_bounds
+from .profiling import stage
+from .shapes import Shape
+
+import numpy as np
+
+from typing import Dict, List, Sequence, Union
+
+COORDINATES = {'cartesian': ('x', 'y', 'z'), 'spherical': ('r', 'lat', 'lon')}
+
+
+class Aggregation:
+    """
+    Result of broni.aggregate(): statistics of the time spent in each of a set of named regions.
+
+    Arrays have the regions as first axis (in the order of names):
+    - dwell_time: total time spent in the region, the sum of the time-steps of the points inside
+    - samples: number of trajectory points inside the region
+    - duration_histogram: number of intervals per duration-bin (edges duration_bins), if requested
+    - occupancy: time spent per spatial bin (edges bins, axes coordinates), if requested
+
+    intervals contains the broni.Intervals of each region (by name).
+
+    Times are in seconds for datetime time-indices and in the units of the time-index otherwise.
+    """
+
+    def __init__(self, names: List[str], intervals: Dict[str, Intervals], dwell_time: np.ndarray,
+                 samples: np.ndarray, duration_bins: np.ndarray = None, duration_histogram: np.ndarray = None,
+                 coordinates: tuple = None, bins: List[np.ndarray] = None, occupancy: np.ndarray = None):
+        self.names = tuple(names)
+        self.intervals = intervals
+        self.dwell_time = dwell_time
+        self.samples = samples
+        self.duration_bins = duration_bins
+        self.duration_histogram = duration_histogram
+        self.coordinates = coordinates
+        self.bins = bins
+        self.occupancy = occupancy
+
+    def index(self, name: str):
+        if name not in self.names:
+            raise ValueError(f"Unknown region '{name}'.")
+        return self.names.index(name)
+
+
+def _seconds(values: np.ndarray):
+    """
+    Time-differences as float, in seconds for datetimes.
+    """
+    if values.dtype.kind == 'm':
+        return values / np.timedelta64(1, 's')
+    return values.astype(float)
+
+
+def _edges(bins: Union[int, Sequence], extent: Sequence = None):
+    """
+    Bin-edges of the three axes, from a number of bins per axis and the extent ((min, max) per axis) or from
+    three arrays of edges.
+    """
+    if np.isscalar(bins):
+        if extent is None or len(extent) != 3:
+            raise ValueError("The extent ((min, max) per axis) is required if the number of bins is given.")
+        return [np.linspace(lo, hi, int(bins) + 1) for lo, hi in extent]
+
+    if len(bins) != 3:
+        raise ValueError("Bin-edges have to be given for the three axes.")
+    edges = [np.asarray(e, dtype=float) for e in bins]
+    for e in edges:
+        if e.ndim != 1 or len(e) < 2 or np.any(np.diff(e) <= 0):
+            raise ValueError("Bin-edges have to be increasing arrays of at least two elements.")
+    return edges
+
+
+def _bin_indices(columns: Sequence[np.ndarray], edges: List[np.ndarray]):
+    """
+    Flat index of the spatial bin of each point and whether the point is inside the binned volume. Like
+    np.histogramdd the last bin of each axis includes its upper edge.
+    """
+    flat = np.zeros(len(columns[0]), dtype=np.intp)
+    valid = np.ones(len(columns[0]), dtype=bool)
+    for values, e in zip(columns, edges):
+        i = np.searchsorted(e, values, side='right') - 1
+        i[values == e[-1]] = len(e) - 2
+        valid &= (i >= 0) & (i < len(e) - 1)
+        flat *= len(e) - 1
+        flat += i
+    return flat, valid
+
+
+def aggregate(trajectory: Trajectory, shps: Dict[str, Union[List[Shape], Shape]],
+              bins: Union[int, Sequence] = None, extent: Sequence = None, coordinates: str = 'cartesian',
+              coordinate_system: str = None, duration_bins: Sequence = None, start=None, stop=None,
+              chunk_size: int = 1 << 20):
+    """
+    Computes the intervals of a set of named regions (as broni.regions(): a shape or a list of shapes each)
+    along with the time spent in each region, a histogram of the interval-durations and a spatial occupancy
+    map (see Aggregation).
+
+    Each point is weighted by its time-step (the time to the next point, the last point has the time-step of the
+    previous one).
+
+    The occupancy map is computed if bins are given: in x, y, z (km) for coordinates='cartesian', in r (km),
+    latitude and longitude (radians, longitude in [0, 2pi)) for coordinates='spherical', in the trajectory's
+    coordinate system or in coordinate_system. bins is either the number of bins per axis (and extent the
+    (min, max) of each axis) or the edges of each axis. Points outside the bins do not count in the map.
+
+    The interval-durations are histogrammed if duration_bins (the edges) are given.
+
+    The trajectory is processed in chunks of chunk_size points (of which the derived data is computed and
+    dropped), so that the memory needed does not depend on the length of the trajectory.
+    """
+    if coordinates not in COORDINATES:
+        raise ValueError(f"Unknown coordinates '{coordinates}', use one of {sorted(COORDINATES)}.")
+    if chunk_size < 1:
+        raise ValueError("The chunk-size has to be at least 1.")
+
+    names = list(shps.keys())
+    shape_lists = [_listify(shps[name]) for name in names]
+    edges = _edges(bins, extent) if bins is not None else None
+    cells = int(np.prod([len(e) - 1 for e in edges])) if edges is not None else 0
+
+    dwell_time = np.zeros(len(names))
+    samples = np.zeros(len(names), dtype=np.int64)
+    occupancy = np.zeros((len(names), cells))
+    bounds = [([], []) for _ in names]
+
+    first, last = trajectory.index_range(start, stop) if start is not None or stop is not None else (0, len(trajectory))
+    time_index = trajectory.time_index
+
+    for i in range(first, last, chunk_size):
+        j = min(i + chunk_size, last)
+        chunk = trajectory[i:j]
+
+        # time-step of each point, the last point has the time-step of the previous one
+        steps = _seconds(np.diff(time_index[i:min(j + 1, last)]))
+        if j == last:
+            steps = np.append(steps, _seconds(np.diff(time_index[j - 2:j])) if j - 2 >= first else 0.)
+
+        cache = _MaskCache(shape_lists)
+        masks = [_intersect_all(chunk, shape_list, cache, name) for name, shape_list in zip(names, shape_lists)]
+
+        with stage('aggregate', j - i):
+            if edges is not None:
+                binned = chunk.to(coordinate_system) if coordinate_system is not None else chunk
+                if coordinates == 'cartesian':
+                    xyz = binned._cartesian_km()
+                    columns = (xyz[:, 0], xyz[:, 1], xyz[:, 2])
+                else:
+                    columns = binned._spherical_km()
+                flat, valid = _bin_indices(columns, edges)
+
+            for k, mask in enumerate(masks):
+                if mask is None:
+                    continue
+
+                dwell_time[k] += steps[mask].sum()
+                samples[k] += np.count_nonzero(mask)
+
+                starts, stops = _mask_to_bounds(mask)
+                bounds[k][0].append(starts + i)
+                bounds[k][1].append(stops + i)
+
+                if edges is not None:
+                    selected = mask & valid
+                    occupancy[k] += np.bincount(flat[selected], weights=steps[selected], minlength=cells)
+
+    intervals = {}
+    empty = np.empty(0, dtype=np.intp)
+    for name, (starts, stops) in zip(names, bounds):
+        # intervals continuing from one chunk to the next are joined
+        intervals[name] = Intervals(trajectory, *_join_bounds(np.concatenate([empty] + starts),
+                                                              np.concatenate([empty] + stops)))
+
+    histogram = None
+    if duration_bins is not None:
+        duration_bins = np.asarray(duration_bins, dtype=float)
+        histogram = np.zeros((len(names), len(duration_bins) - 1), dtype=np.int64)
+        for k, name in enumerate(names):
+            histogram[k] = np.histogram(_seconds(intervals[name].duration), duration_bins)[0]
+
+    if edges is None:
+        return Aggregation(names, intervals, dwell_time, samples, duration_bins, histogram)
+
+    occupancy = occupancy.reshape((len(names),) + tuple(len(e) - 1 for e in edges))
+    return Aggregation(names, intervals, dwell_time, samples, duration_bins, histogram,
+                       COORDINATES[coordinates], edges, occupancy)
@@ -0,0 +1,119 @@
+"""
+Time-dependent rotations between geocentric coordinate systems (GEI, GEO, GSE, GSM and SM) following
+Hapgood, M. A. (1992), Space physics coordinate transformations: A user guide, Planet. Space Sci., 40(5).
+
+The dipole axis is taken from the IGRF-13 coefficients of epoch 2020 (secular variation is neglected).
+"""
+
+import numpy as np
+
+FRAMES = ('gei', 'geo', 'gse', 'gsm', 'sm')
+
+_IGRF_G10, _IGRF_G11, _IGRF_H11 = -29404.8, -1450.9, 4652.5
+_DIPOLE_GEO = -np.array((_IGRF_G11, _IGRF_H11, _IGRF_G10)) / np.linalg.norm((_IGRF_G11, _IGRF_H11, _IGRF_G10))
+
+_J2000 = np.datetime64('2000-01-01T12:00', 'ns')
+
+
+def _rotation(angle: np.ndarray, axis: int):
+    """
+    Hapgood's <angle, axis>-matrix for each angle (in degrees), shape (N, 3, 3).
+    """
+    c, s = np.cos(np.radians(angle)), np.sin(np.radians(angle))
+    i, j = [(1, 2), (0, 2), (0, 1)][axis]
+
+    m = np.zeros(np.shape(angle) + (3, 3))
+    m[..., axis, axis] = 1
+    m[..., i, i] = c
+    m[..., j, j] = c
+    m[..., i, j] = s if axis != 1 else -s
+    m[..., j, i] = -s if axis != 1 else s
+    return m
+
+
+def _from_gei(frame: str, time: np.ndarray):
+    """
+    Rotation matrices from GEI to frame for each time (datetime64[ns]), shape (N, 3, 3).
+    """
+    if frame == 'gei':
+        return np.broadcast_to(np.eye(3), time.shape + (3, 3))
+
+    midnight = time.astype('datetime64[D]')
+    t0 = (midnight - _J2000) / np.timedelta64(1, 'D') / 36525.0
+    h = (time - midnight) / np.timedelta64(1, 'h')
+
+    theta = 100.461 + 36000.770 * t0 + 15.04107 * h
+    t1 = _rotation(theta, 2)
+    if frame == 'geo':
+        return t1
+
+    eps = 23.439 - 0.013 * t0
+    m = np.radians(357.528 + 35999.050 * t0 + 0.04107 * h)
+    lam = 280.460 + 36000.772 * t0 + 0.04107 * h
+    lam_sun = lam + (1.915 - 0.0048 * t0) * np.sin(m) + 0.020 * np.sin(2 * m)
+    t2 = _rotation(lam_sun, 2) @ _rotation(eps, 0)
+    if frame == 'gse':
+        return t2
+
+    # dipole axis in GSE: T2 * T1^T * Q_g
+    q = np.einsum('nij,nkj,k->ni', t2, t1, _DIPOLE_GEO)
+    psi = np.degrees(np.arctan2(q[:, 1], q[:, 2]))
+    t3 = _rotation(-psi, 0) @ t2
+    if frame == 'gsm':
+        return t3
+
+    mu = np.degrees(np.arctan2(q[:, 0], np.hypot(q[:, 1], q[:, 2])))
+    return _rotation(mu, 1) @ t3
+
+
+def _check_frame(frame: str):
+    frame = frame.lower()
+    if frame not in FRAMES:
+        raise ValueError(f"Unsupported coordinate system '{frame}', supported are {', '.join(FRAMES)}.")
+    return frame
+
+
+def rotation_matrices(time: np.ndarray, source: str, target: str):
+    """
+    Returns the rotation matrices (shape (N, 3, 3)) transforming vectors from the source to the target coordinate
+    system at the given times (datetime64).
+    """
+    time = np.asarray(time).astype('datetime64[ns]')
+    source, target = _check_frame(source), _check_frame(target)
+    return _from_gei(target, time) @ np.swapaxes(_from_gei(source, time), 1, 2)
+
+
+def transform(xyz: np.ndarray, time: np.ndarray, source: str, target: str,
+              cadence: np.timedelta64 = np.timedelta64(1, 'm'),
+              chunk_size: int = 1 << 20):
+    """
+    Transforms the (N, 3)-array of positions xyz given at time (datetime64[ns], in any order) from the source to
+    the target coordinate system.
+
+    The rotation matrices are computed at the given cadence (or at the sample times if these are sparser) and
+    linearly interpolated to the sample times, the rotation itself is a batched einsum over chunks of chunk_size
+    samples. The rotation is computed in double precision, the result has the precision of xyz (at least single).
+    """
+    out = np.empty(xyz.shape, dtype=np.result_type(xyz.dtype, np.float32))
+    if len(xyz) == 0:
+        return out
+
+    time = np.asarray(time).astype('datetime64[ns]')
+    start = time.min()
+    steps = int(np.ceil((time.max() - start) / cadence)) + 1
+
+    if steps >= len(time):
+        for i in range(0, len(time), chunk_size):
+            s = slice(i, i + chunk_size)
+            out[s] = np.einsum('nij,nj->ni', rotation_matrices(time[s], source, target), xyz[s])
+        return out
+
+    nodes = rotation_matrices(start + np.arange(steps + 1) * cadence.astype('timedelta64[ns]'), source, target)
+    for i in range(0, len(time), chunk_size):
+        s = slice(i, i + chunk_size)
+        pos = (time[s] - start) / cadence
+        index = np.minimum(pos.astype(np.intp), steps - 1)
+        weight = (pos - index)[:, np.newaxis, np.newaxis]
+        matrices = nodes[index] * (1 - weight) + nodes[index + 1] * weight
+        out[s] = np.einsum('nij,nj->ni', matrices, xyz[s])
+    return out
@@ -0,0 +1,121 @@
+"""
+Intervals of long trajectories computed on partitions of the trajectory in parallel, on a pool of processes or
+on a Dask cluster.
+
+Each partition (a range of trajectory points) is intersected with the shapes by a worker, the intervals found
+on the partitions are then joined where they continue from one partition to the next. The results are the same
+as the ones of broni.interval_table() and broni.intervals().
+
+The shapes are pickled once per call and unpickled once per worker-process, with their precomputed state (e.g.
+the grids of ShapeCollection and MeshShape). Before Python 3.7 (no initializer for ProcessPoolExecutor) they are
+sent with each partition and still unpickled once per worker-process.
+"""
+
+import pickle
+import sys
+import threading
+import uuid
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import Trajectory, Shape, Intervals, _listify, _intersect_all, _mask_to_bounds, _join_bounds
+
+from typing import List, Union
+
+# per process: the shapes of the last call (token, shapes), shared by the threads of threaded executors
+_SHAPES = {}
+_SHAPES_LOCK = threading.Lock()
+
+# ProcessPoolExecutor's initializer (Python 3.7), without it the shapes are sent with each partition
+_POOL_INITIALIZER = sys.version_info >= (3, 7)
+
+
+def _load_shapes(token: str, payload: bytes):
+    with _SHAPES_LOCK:
+        shapes = _SHAPES.get(token)
+        if shapes is None:
+            shapes = pickle.loads(payload)
+            _SHAPES.clear()
+            _SHAPES[token] = shapes
+    return shapes
+
+
+def _partition_bounds(token: str, payload: bytes, cartesian: np.ndarray, time_index: np.ndarray,
+                      coordinate_system: str, guard: str, offset: int):
+    """
+    First and last index (inclusive, in the whole trajectory) of the intervals found on one partition (of the
+    precision of cartesian).
+    """
+    trajectory = Trajectory._from_cartesian(cartesian, time_index, coordinate_system, guard)
+
+    mask = _intersect_all(trajectory, _load_shapes(token, payload))
+    if mask is None:
+        mask = np.zeros(0, dtype=bool)
+    starts, stops = _mask_to_bounds(mask)
+    return starts + offset, stops + offset
+
+
+def partitions(first: int, last: int, partition_size: int):
+    """
+    Splits the index range [first, last) into ranges of at most partition_size points.
+    """
+    bounds = list(range(first, last, partition_size)) + [last]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def interval_table(trajectory: Trajectory, shps: Union[List[Shape], Shape], start=None, stop=None,
+                   partition_size: int = 1 << 20, executor=None, workers: int = None):
+    """
+    Same as broni.interval_table() but computed on partitions of partition_size points in parallel.
+
+    executor can be any object having a submit()-method returning futures (a concurrent.futures.Executor or a
+    dask.distributed.Client), by default a ProcessPoolExecutor of workers processes is used for the call
+    (None for one per CPU).
+    """
+    if partition_size < 1:
+        raise ValueError("The partition-size has to be at least 1.")
+
+    first, last = trajectory.index_range(start, stop) if start is not None or stop is not None else (0, len(trajectory))
+    # positions of the window only (shared with the trajectory if it has already computed them for all points)
+    cartesian = trajectory[first:last]._cartesian_km()
+    time_index = trajectory.time_index
+
+    token = uuid.uuid4().hex
+    payload = pickle.dumps(_listify(shps), protocol=pickle.HIGHEST_PROTOCOL)
+
+    pool = None
+    task_payload = payload
+    if executor is None and _POOL_INITIALIZER:
+        # the shapes are sent to the processes of our own pool once, with their initialization
+        executor = pool = ProcessPoolExecutor(workers, initializer=_load_shapes, initargs=(token, payload))
+        task_payload = None
+    elif executor is None:
+        executor = pool = ProcessPoolExecutor(workers)
+
+    try:
+        futures = [executor.submit(_partition_bounds, token, task_payload,
+                                   cartesian[i - first:j - first], time_index[i:j], trajectory.coordinate_system,
+                                   trajectory.guard, i)
+                   for i, j in partitions(first, last, partition_size)]
+        bounds = [future.result() for future in futures]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    empty = np.empty(0, dtype=np.intp)
+    starts = np.concatenate([empty] + [b[0] for b in bounds]).astype(np.intp, copy=False)
+    stops = np.concatenate([empty] + [b[1] for b in bounds]).astype(np.intp, copy=False)
+
+    # intervals reaching the end of a partition continued by an interval at the start of the next one are joined
+    return Intervals(trajectory, *_join_bounds(starts, stops))
+
+
+def intervals(trajectory: Trajectory, shps: Union[List[Shape], Shape], start=None, stop=None,
+              partition_size: int = 1 << 20, executor=None, workers: int = None):
+    """
+    Same as broni.intervals() but computed on partitions of partition_size points in parallel (see
+    interval_table()).
+    """
+    return interval_table(trajectory, shps, start, stop, partition_size, executor, workers).to_list()
@@ -0,0 +1,214 @@
+"""
+Opt-in instrumentation of the processing stages (spherical conversion, callbacks, unit conversions,
+shape-intersections, interval extraction, ...).
+
+    with broni.profiling.profile() as report:
+        broni.intervals(trajectory, shapes)
+    print(report)
+
+Outside of profile() (and without hooks) stage() returns a shared no-op context manager, the overhead is a
+function call per stage.
+"""
+
+import time
+import tracemalloc
+from typing import Callable, List
+
+_profilers = []
+_hooks = []
+
+# tracemalloc.reset_peak() is available from Python 3.9, before the peak is only known since the start of tracing
+_reset_peak = getattr(tracemalloc, 'reset_peak', None)
+
+
+class StageRecord:
+    """
+    Measurements of one execution of a stage: wall-time in seconds, number of samples processed, number of samples
+    surviving (for shapes: points inside) and bytes allocated (peak, only with memory-tracing).
+
+    shape_id identifies the shape-instance of the call (its position in the shape list, prefixed by the region
+    name for broni.regions() and broni.aggregate()), callbacks inherit the shape_id of the shape evaluating them.
+    """
+    __slots__ = ('name', 'shape', 'shape_id', 'depth', 'wall_time', 'samples', 'surviving', 'allocated',
+                 '_start', '_memory', '_peak', '_start_peak')
+
+    def __init__(self, name: str, shape: str = None, samples: int = None, depth: int = 0, shape_id: str = None):
+        self.name = name
+        self.shape = shape
+        self.shape_id = shape_id
+        self.depth = depth
+        self.samples = samples
+        self.surviving = None
+        self.wall_time = None
+        self.allocated = None
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in ('name', 'shape', 'shape_id', 'depth', 'wall_time', 'samples',
+                                                       'surviving', 'allocated')}
+
+
+class Report:
+    """
+    Records of all stages executed within a profile()-block, in order of their completion.
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def summary(self):
+        """
+        Records aggregated per stage and shape-instance (shape and shape_id): a list of dicts with count, wall_time,
+        samples, surviving and allocated (sums, allocated is the maximum).
+        """
+        summary = {}
+        for record in self.records:
+            entry = summary.setdefault((record.name, record.shape, record.shape_id), {
+                'name': record.name, 'shape': record.shape, 'shape_id': record.shape_id, 'count': 0, 'wall_time': 0.0,
+                'samples': None, 'surviving': None, 'allocated': None})
+            entry['count'] += 1
+            entry['wall_time'] += record.wall_time
+            for key in ('samples', 'surviving'):
+                if getattr(record, key) is not None:
+                    entry[key] = (entry[key] or 0) + getattr(record, key)
+            if record.allocated is not None:
+                entry['allocated'] = max(entry['allocated'] or 0, record.allocated)
+        return list(summary.values())
+
+    def __str__(self):
+        lines = [f"{'stage':<24} {'shape':<30} {'count':>6} {'time [ms]':>11} {'samples':>12} {'surviving':>12} "
+                 f"{'allocated':>12}"]
+        for entry in self.summary():
+            shape = ' '.join(value for value in (entry['shape'], entry['shape_id']) if value is not None)
+            lines.append(f"{entry['name']:<24} {shape:<30} {entry['count']:>6} "
+                         f"{entry['wall_time'] * 1e3:>11.3f} {_fmt(entry['samples']):>12} "
+                         f"{_fmt(entry['surviving']):>12} {_fmt(entry['allocated']):>12}")
+        return '\n'.join(lines)
+
+
+def _fmt(value):
+    return '' if value is None else str(value)
+
+
+class _NullStage:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def _peak_since(record: StageRecord):
+    """
+    Peak of the traced memory since the start of a stage (or the last reset). Without reset_peak() a peak not
+    above the one at the start of the stage was reached before it, then only the current memory is known.
+    """
+    current, peak = tracemalloc.get_traced_memory()
+    if _reset_peak is None and peak <= record._start_peak:
+        return current
+    return peak
+
+
+class _Stage:
+    _stack: List[StageRecord] = []
+
+    def __init__(self, record: StageRecord):
+        self.record = record
+
+    def __enter__(self):
+        record = self.record
+        record.depth = len(_Stage._stack)
+        if record.shape is not None and record.shape_id is None:
+            record.shape_id = next((parent.shape_id for parent in reversed(_Stage._stack)
+                                    if parent.shape_id is not None), None)
+        if tracemalloc.is_tracing():
+            if _Stage._stack:
+                parent = _Stage._stack[-1]
+                parent._peak = max(parent._peak, _peak_since(parent))
+            if _reset_peak is not None:
+                _reset_peak()
+            record._memory, record._start_peak = tracemalloc.get_traced_memory()
+            record._peak = record._memory
+        else:
+            record._memory = None
+        _Stage._stack.append(record)
+
+        for hook in _hooks:
+            hook('enter', record)
+        record._start = time.perf_counter()
+        return record
+
+    def __exit__(self, *args):
+        record = self.record
+        record.wall_time = time.perf_counter() - record._start
+
+        _Stage._stack.pop()
+        if record._memory is not None and tracemalloc.is_tracing():
+            peak = max(record._peak, _peak_since(record))
+            record.allocated = peak - record._memory
+            if _Stage._stack:
+                parent = _Stage._stack[-1]
+                parent._peak = max(parent._peak, peak)
+
+        for hook in _hooks:
+            hook('exit', record)
+        for report in _profilers:
+            report.records.append(record)
+        return False
+
+
+def _name(obj):
+    if obj is None or isinstance(obj, str):
+        return obj
+    obj = getattr(obj, 'func', obj)  # functools.partial
+    return getattr(obj, '__name__', type(obj).__name__)
+
+
+def stage(name: str, samples: int = None, shape=None, shape_id: str = None):
+    """
+    Context manager measuring a processing stage, returns the StageRecord (or None if profiling is disabled).
+    shape is the name of the shape (or callback) processed or the object itself, shape_id identifies the
+    shape-instance.
+    """
+    if not _profilers and not _hooks:
+        return _NULL_STAGE
+    return _Stage(StageRecord(name, _name(shape), samples, shape_id=shape_id))
+
+
+class profile:
+    """
+    Context manager enabling the instrumentation, returns the Report collecting the records of all stages.
+    With memory=True allocations are traced with tracemalloc (which slows down the processing).
+    """
+
+    def __init__(self, memory: bool = True):
+        self._memory = memory
+        self._started_tracing = False
+        self.report = Report()
+
+    def __enter__(self):
+        if self._memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        _profilers.append(self.report)
+        return self.report
+
+    def __exit__(self, *args):
+        _profilers.remove(self.report)
+        if self._started_tracing:
+            tracemalloc.stop()
+        return False
+
+
+def add_hook(hook: Callable[[str, StageRecord], None]):
+    """
+    Registers a hook for external tracers, it is called with ('enter', record) when a stage starts and with
+    ('exit', record) when it ends.
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[str, StageRecord], None]):
+    _hooks.remove(hook)
@@ -0,0 +1,74 @@
+from . import Trajectory, _listify, _intersect_all, _MaskCache
+from .shapes import Shape
+
+import numpy as np
+
+from typing import Dict, List, Union
+
+
+def _code_dtype(count: int):
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if count <= np.iinfo(dtype).bits:
+            return dtype
+    raise ValueError(f"At most 64 regions can be labeled at once, got {count}.")
+
+
+class Regions:
+    """
+    Result of broni.regions(): per trajectory point a bitfield-code where bit i is set if the point is
+    inside the region names[i].
+
+    The codes are stored in the smallest unsigned integer type which can hold one bit per region, the
+    timeline is stored run-length-encoded (first index and code of each run).
+    """
+
+    def __init__(self, trajectory: Trajectory, names: List[str], codes: np.ndarray):
+        self.names = tuple(names)
+        self.codes = codes
+        self._time_index = trajectory.time_index
+
+        change = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+        self.run_starts = np.concatenate(([0], change)) if len(codes) else np.empty(0, dtype=np.intp)
+        self.run_stops = np.concatenate((change - 1, [len(codes) - 1])) if len(codes) else np.empty(0, dtype=np.intp)
+        self.run_codes = codes[self.run_starts]
+
+    def bit(self, name: str):
+        if name not in self.names:
+            raise ValueError(f"Unknown region '{name}'.")
+        return self.codes.dtype.type(1) << self.codes.dtype.type(self.names.index(name))
+
+    def mask(self, name: str):
+        return (self.codes & self.bit(name)) != 0
+
+    def names_of(self, code: int):
+        return tuple(name for i, name in enumerate(self.names) if int(code) >> i & 1)
+
+    def timeline(self):
+        """
+        List of (start-time, stop-time, region-names) for each run of points sharing the same regions. Runs
+        outside all regions are included with an empty region-name-tuple.
+        """
+        return [(self._time_index[start], self._time_index[stop], self.names_of(code))
+                for start, stop, code in zip(self.run_starts, self.run_stops, self.run_codes)]
+
+
+def regions(trajectory: Trajectory, shps: Dict[str, Union[List[Shape], Shape]]):
+    """
+    Classifies each trajectory point against a set of named regions in one pass. Each region is defined
+    by a shape or a list of shapes (logical-and, as with broni.intervals()). Regions may overlap.
+
+    A shape-instance used by several regions is only evaluated once, its mask is kept until the last region
+    using it.
+    """
+    names = list(shps.keys())
+    dtype = _code_dtype(len(names))
+
+    codes = np.zeros(len(trajectory.time_index), dtype=dtype)
+    shape_lists = [_listify(shps[name]) for name in names]
+    cache = _MaskCache(shape_lists)
+    for i, (name, shape_list) in enumerate(zip(names, shape_lists)):
+        mask = _intersect_all(trajectory, shape_list, cache, name)
+        if mask is not None:
+            codes[mask] |= dtype(1) << dtype(i)
+
+    return Regions(trajectory, names, codes)
@@ -0,0 +1,114 @@
+from . import Trajectory
+
+import numpy as np
+
+from typing import Callable, Union
+
+
+class Intervals:
+    """
+    Column-oriented list of intervals found on a trajectory.
+
+    Each column is a contiguous np.array: start_index and stop_index (both inclusive), start and stop (the
+    corresponding values of the trajectory's time-index) and duration (stop - start). Per-interval statistics
+    can be added with add_statistic() and are exported along with the other columns.
+
+    Iterating over an Intervals-object gives (start, stop)-tuples, the same as broni.intervals() returns.
+    """
+
+    def __init__(self, trajectory: Trajectory, start_index: np.ndarray, stop_index: np.ndarray,
+                 statistics: dict = None):
+        time_index = np.asarray(trajectory.time_index)
+
+        self.start_index = start_index
+        self.stop_index = stop_index
+        self.start = time_index[start_index]
+        self.stop = time_index[stop_index]
+        self.statistics = dict(statistics) if statistics is not None else {}
+
+    def __len__(self):
+        return len(self.start_index)
+
+    def __iter__(self):
+        return zip(self.start, self.stop)
+
+    def to_list(self):
+        return list(self)
+
+    @property
+    def duration(self):
+        return self.stop - self.start
+
+    def add_statistic(self, name: str, values: np.ndarray, reducer: Union[str, Callable] = 'mean'):
+        """
+        Adds a column containing a per-interval reduction of values, which has to have one element per
+        trajectory-point. reducer is one of 'sum', 'mean', 'min', 'max' or a ufunc having a reduceat-method.
+
+        The reduction is done with a single reduceat-call over all intervals.
+        """
+        if name in self.columns():
+            raise ValueError(f"Column '{name}' already exists.")
+
+        values = np.asarray(values)
+        if len(self) == 0:
+            self.statistics[name] = np.empty(0, dtype=float if reducer == 'mean' else values.dtype)
+            return self
+
+        # reduceat reduces [i, j) for consecutive index pairs: interleave starts and stops + 1 and keep every 2nd.
+        # Intervals are not necessarily sorted (e.g. per shape), any of them can end at the last point: values is
+        # padded by one element so that all stops + 1 are valid indices.
+        bounds = np.empty(2 * len(self), dtype=np.intp)
+        bounds[0::2] = self.start_index
+        bounds[1::2] = self.stop_index + 1
+        values = np.append(values, values[-1:])
+
+        ufunc = {'sum': np.add, 'mean': np.add, 'min': np.minimum, 'max': np.maximum}.get(reducer, reducer)
+        if isinstance(ufunc, str):
+            raise ValueError(f"Unknown reducer '{reducer}'.")
+
+        result = ufunc.reduceat(values, bounds)[0::2]
+        if reducer == 'mean':
+            result = result / (self.stop_index - self.start_index + 1)
+        self.statistics[name] = result
+        return self
+
+    def columns(self):
+        columns = {'start_index': self.start_index,
+                   'stop_index': self.stop_index,
+                   'start': self.start,
+                   'stop': self.stop,
+                   'duration': self.duration}
+        columns.update(self.statistics)
+        return columns
+
+    def to_numpy(self):
+        """
+        Returns the intervals as NumPy structured array with one field per column.
+        """
+        columns = self.columns()
+        result = np.empty(len(self), dtype=[(name, column.dtype) for name, column in columns.items()])
+        for name, column in columns.items():
+            result[name] = column
+        return result
+
+    def to_arrow(self):
+        """
+        Returns the intervals as pyarrow.Table. Numerical and datetime64-columns are not copied.
+        """
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError("pyarrow is required to export intervals to Arrow.")
+
+        return pyarrow.table({name: pyarrow.array(column) for name, column in self.columns().items()})
+
+    def to_parquet(self, path, **kwargs):
+        """
+        Writes the intervals to a Parquet-file, kwargs are forwarded to pyarrow.parquet.write_table().
+        """
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("pyarrow is required to export intervals to Parquet.")
+
+        pyarrow.parquet.write_table(self.to_arrow(), path, **kwargs)
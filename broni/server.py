@@ -0,0 +1,405 @@
+"""
+Local query service keeping trajectories and their derived data (cartesian positions, spherical coordinates)
+resident, so that several analysis-processes or dashboards querying the same ephemerides do not have to load
+them and recompute the derived data each time.
+
+The server listens on a unix-socket (or TCP) and speaks newline-delimited JSON: each request is one JSON-object
+on one line, the response is one JSON-object on one line.
+
+    {"trajectory": "mms1", "shapes": [<shape-specification>, ...], "start": "2020-01-01", "stop": "2020-02-01"}
+    -> {"intervals": [["2020-01-03T10:12:00.000000000", "2020-01-03T12:40:00.000000000"], ...]}
+
+    {"op": "trajectories"}
+    -> {"trajectories": ["mms1", ...]}
+
+Shapes are given as specifications (see broni.shapes.spec), start and stop are optional. Errors are returned
+as {"error": "<message>"}.
+
+Queries are computed on a process-pool, the trajectories are shared with the workers through shared memory
+(no copy per query or per worker). Results are kept in an LRU-cache and concurrent identical requests are
+computed only once.
+
+The server requires Python 3.8 (for multiprocessing.shared_memory), the rest of broni does not depend on it.
+"""
+
+import asyncio
+import ctypes
+import json
+import socket
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from . import Trajectory, Intervals, interval_table
+from .shapes.spec import from_spec
+
+from typing import Union
+
+# alignment of the arrays in the shared memory blocks
+_ALIGNMENT = 64
+
+
+# shared memory blocks which were still referenced when they were closed, closing them is retried later
+_UNCLOSED = []
+
+
+def _close(shm: shared_memory.SharedMemory):
+    """
+    Closes a shared memory block once no array on it is left (else on a later call).
+    """
+    _UNCLOSED.append(shm)
+    for block in list(_UNCLOSED):
+        try:
+            block.close()
+            _UNCLOSED.remove(block)
+        except BufferError:
+            pass
+
+
+def _on_block(shm: shared_memory.SharedMemory, descriptor: tuple):
+    """
+    Trajectory (with its derived data) on the arrays of a shared memory block, nothing is copied.
+    """
+    name, layout, coordinate_system, dtype, guard = descriptor
+
+    # NumPy does not hold the buffer of shm.buf, closing the block would unmap the arrays. A ctypes-array on it
+    # (the base of the arrays) holds the buffer, the block can then only be closed once all arrays are released.
+    buffer = (ctypes.c_char * len(shm.buf)).from_buffer(shm.buf)
+    arrays = {}
+    for key, array_dtype, shape, offset in layout:
+        arrays[key] = np.ndarray(shape, array_dtype, buffer=buffer, offset=offset)
+        arrays[key].flags.writeable = False
+
+    trajectory = Trajectory._from_cartesian(arrays['cartesian'], arrays['time_index'], coordinate_system, guard)
+    trajectory._r, trajectory._lat, trajectory._lon = arrays['r'], arrays['lat'], arrays['lon']
+    return trajectory
+
+
+class SharedTrajectory:
+    """
+    Copy of a trajectory and its derived data in one block of shared memory. The descriptor (a small, picklable
+    tuple) is sent to the worker-processes which attach to the block with _attach().
+
+    trajectory is the trajectory on the block, which is used in place of the given one so that only one copy
+    stays resident.
+    """
+
+    def __init__(self, trajectory: Trajectory):
+        time_index = np.asarray(trajectory.time_index)
+        if time_index.dtype.kind == 'O':
+            raise ValueError("Trajectories with an object time-index cannot be shared.")
+
+        r, lat, lon = trajectory._spherical_km()
+        arrays = {'cartesian': trajectory._cartesian_km(), 'r': r, 'lat': lat, 'lon': lon, 'time_index': time_index}
+
+        layout, size = [], 0
+        for name, array in arrays.items():
+            layout.append((name, array.dtype.str, array.shape, size))
+            size += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+
+        self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for (name, dtype, shape, offset), array in zip(layout, arrays.values()):
+            np.ndarray(shape, dtype, buffer=self._shm.buf, offset=offset)[...] = array
+
+        self.descriptor = (self._shm.name, tuple(layout), trajectory.coordinate_system,
+                           trajectory.dtype.str, trajectory.guard)
+        self.trajectory = _on_block(self._shm, self.descriptor)
+
+    def close(self):
+        self.trajectory = None
+        self._shm.unlink()
+        _close(self._shm)
+
+
+# per process: shared memory name -> (SharedMemory, Trajectory)
+_ATTACHED = {}
+
+# per process: canonical JSON of the shape-specifications -> shapes, shared by the threads computing the queries
+# of a server without worker-processes
+_SHAPES = OrderedDict()
+_SHAPES_SIZE = 256
+_SHAPES_LOCK = threading.Lock()
+
+
+def _detach(live: set):
+    """
+    Releases the shared memory blocks of removed or replaced trajectories (not in live).
+    """
+    for name in [name for name in _ATTACHED if name not in live]:
+        shm, trajectory = _ATTACHED.pop(name)
+        del trajectory
+        _close(shm)
+
+
+def _attach(descriptor: tuple):
+    """
+    Trajectory on the shared memory block of a SharedTrajectory, created once per process.
+    """
+    name = descriptor[0]
+    if name not in _ATTACHED:
+        shm = shared_memory.SharedMemory(name=name)
+        _ATTACHED[name] = (shm, _on_block(shm, descriptor))
+    return _ATTACHED[name][1]
+
+
+def _shapes(specs: list):
+    key = json.dumps(specs, sort_keys=True)
+    with _SHAPES_LOCK:
+        if key in _SHAPES:
+            _SHAPES.move_to_end(key)
+            return _SHAPES[key]
+
+    # built outside of the lock, an invalid specification raises before anything is stored
+    shapes = [from_spec(spec) for spec in specs]
+    with _SHAPES_LOCK:
+        _SHAPES[key] = shapes
+        if len(_SHAPES) > _SHAPES_SIZE:
+            _SHAPES.popitem(last=False)
+    return shapes
+
+
+def _query(trajectory: Union[Trajectory, tuple], specs: list, start, stop, live: tuple = ()):
+    """
+    Computes the start- and stop-indices of the intervals of a query (in a worker for a descriptor of a
+    SharedTrajectory, else in the server-process). live are the names of the shared memory blocks of all
+    trajectories of the server, the other blocks are released.
+    """
+    if isinstance(trajectory, tuple):
+        _detach(set(live))
+        trajectory = _attach(trajectory)
+
+    table = interval_table(trajectory, _shapes(specs), start, stop)
+    return table.start_index, table.stop_index
+
+
+def _to_json(values: np.ndarray):
+    if values.dtype.kind == 'M':
+        return np.datetime_as_string(values).tolist()
+    return values.tolist()
+
+
+class QueryServer:
+    """
+    Keeps trajectories resident and computes intervals-queries for them (see the module documentation for
+    the protocol).
+
+    With workers=0 the queries are computed on a thread of the server-process, otherwise on a pool of
+    worker-processes (of workers processes, None for one per CPU) with which the trajectories are shared.
+    The results of the last cache_size distinct queries are cached.
+
+    statistics counts the requests, the cache-hits, the requests which were batched with an identical request
+    being computed and the computed queries.
+    """
+
+    def __init__(self, workers: int = None, cache_size: int = 1024):
+        self._trajectories = {}
+        self._shared = {}
+        self._workers = workers
+        self._pool = None
+
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._pending = {}
+
+        self.statistics = {'requests': 0, 'cache_hits': 0, 'batched': 0, 'computed': 0}
+
+    def add_trajectory(self, name: str, trajectory: Trajectory):
+        """
+        Makes a trajectory available under a name (replacing a previous one of the same name). Its derived data
+        is computed right away. With worker-processes the server keeps the trajectory in the shared memory block
+        only (the given trajectory is not referenced).
+        """
+        trajectory._spherical_km()
+        shared = SharedTrajectory(trajectory) if self._workers != 0 else None
+
+        self.remove_trajectory(name)
+        if shared is not None:
+            self._shared[name] = shared
+            trajectory = shared.trajectory
+        self._trajectories[name] = trajectory
+
+    def remove_trajectory(self, name: str):
+        if self._trajectories.pop(name, None) is not None:
+            for key in [key for key in self._cache if key[0] == name]:
+                del self._cache[key]
+        if name in self._shared:
+            self._shared.pop(name).close()
+
+    @property
+    def trajectories(self):
+        return sorted(self._trajectories)
+
+    async def query(self, request: dict):
+        """
+        Answers a request (a dict, see the module documentation). Raises ValueError for invalid requests.
+        """
+        self.statistics['requests'] += 1
+
+        op = request.get('op', 'intervals')
+        if op == 'trajectories':
+            return {'trajectories': self.trajectories}
+        if op != 'intervals':
+            raise ValueError(f"Unknown operation '{op}'.")
+
+        name = request.get('trajectory')
+        if name not in self._trajectories:
+            raise ValueError(f"Unknown trajectory '{name}'.")
+
+        specs = request.get('shapes', [])
+        if isinstance(specs, dict):
+            specs = [specs]
+        start, stop = request.get('start'), request.get('stop')
+
+        key = (name, json.dumps([specs, start, stop], sort_keys=True))
+        if key in self._cache:
+            self.statistics['cache_hits'] += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        if key in self._pending:
+            self.statistics['batched'] += 1
+        else:
+            self._pending[key] = asyncio.ensure_future(self._compute(key, name, specs, start, stop))
+            self._pending[key].add_done_callback(lambda _: self._pending.pop(key, None))
+
+        # shielded: a cancelled request does not cancel the computation for the batched ones
+        return await asyncio.shield(self._pending[key])
+
+    async def _compute(self, key: tuple, name: str, specs: list, start, stop):
+        trajectory = self._trajectories[name]
+        loop = asyncio.get_running_loop()
+
+        self.statistics['computed'] += 1
+        if self._workers == 0:
+            starts, stops = await loop.run_in_executor(None, _query, trajectory, specs, start, stop)
+        else:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self._workers)
+            live = tuple(shared.descriptor[0] for shared in self._shared.values())
+            starts, stops = await loop.run_in_executor(self._pool, _query, self._shared[name].descriptor,
+                                                       specs, start, stop, live)
+
+        table = Intervals(trajectory, starts, stops)
+        result = {'intervals': list(map(list, zip(_to_json(table.start), _to_json(table.stop))))}
+
+        # the trajectory may have been replaced in the meantime
+        if self._trajectories.get(name) is trajectory:
+            self._cache[key] = result
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("A request has to be a JSON-object.")
+                    response = await self.query(request)
+                except ValueError as e:
+                    response = {'error': str(e)}
+                except Exception as e:
+                    # any failure of a request (e.g. of a shape built from a specification) is reported to the client
+                    response = {'error': f"{type(e).__name__}: {e}"}
+
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # client gone or server shutting down, this handler is the top of its task
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, path: str = None, host: str = '127.0.0.1', port: int = 0):
+        """
+        Starts listening on the unix-socket path (if given) or else on host:port. Returns the asyncio.Server.
+        """
+        if path is not None:
+            return await asyncio.start_unix_server(self._handle, path, limit=1 << 24)
+        return await asyncio.start_server(self._handle, host, port, limit=1 << 24)
+
+    def run(self, path: str = None, host: str = '127.0.0.1', port: int = 0):
+        """
+        Serves (see serve()) until interrupted, then closes the server.
+        """
+        async def main():
+            server = await self.serve(path, host, port)
+            async with server:
+                await server.serve_forever()
+
+        try:
+            asyncio.run(main())
+        finally:
+            self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        for name in list(self._trajectories):
+            self.remove_trajectory(name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Client:
+    """
+    Blocking client of a QueryServer listening on the unix-socket path (if given) or on host:port.
+    """
+
+    def __init__(self, path: str = None, host: str = '127.0.0.1', port: int = None):
+        if path is not None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(path)
+        else:
+            self._socket = socket.create_connection((host, port))
+        self._file = self._socket.makefile('rwb')
+
+    def query(self, request: dict):
+        """
+        Sends a request and returns the response, raises ValueError if the server returned an error and
+        ConnectionError if the server closed the connection.
+        """
+        self._file.write(json.dumps(request).encode() + b'\n')
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("The server closed the connection.")
+        response = json.loads(line)
+        if 'error' in response:
+            raise ValueError(response['error'])
+        return response
+
+    def intervals(self, trajectory: str, shapes: Union[list, dict], start=None, stop=None):
+        """
+        Returns the list of (start, stop)-intervals (as JSON-values, ISO-strings for datetimes).
+        """
+        request = {'trajectory': trajectory, 'shapes': shapes}
+        if start is not None:
+            request['start'] = start
+        if stop is not None:
+            request['stop'] = stop
+        return [tuple(interval) for interval in self.query(request)['intervals']]
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,3 +1,30 @@
+import numpy as np
+
+
 class Shape:
-    pass
+    """
+    Base-class of all shapes. A shape defined in a specific coordinate system (coordinate_system is not None)
+    evaluates trajectories of another coordinate system after transforming them (see Trajectory.to()).
+    """
+
+    coordinate_system = None
+
+    def _in_frame(self, trajectory):
+        if self.coordinate_system is None or trajectory.coordinate_system is None:
+            return trajectory
+        return trajectory.to(self.coordinate_system)
+
+    def _resolve(self, trajectory, result, ambiguous, evaluate=None):
+        """
+        Resolves the points within the guard band of reduced precision trajectories (see Trajectory): either
+        re-evaluates them in double precision with evaluate (intersect by default) or selects them.
+        """
+        indices = np.flatnonzero(ambiguous)
+        if len(indices) == 0:
+            return result
 
+        if trajectory.guard == 'conservative':
+            result[indices] = True
+        else:
+            result[indices] = (evaluate or self.intersect)(trajectory._subset(indices))
+        return result
@@ -1,12 +1,57 @@
 from . import Shape
 from .. import Trajectory
+from ..profiling import stage
+
+from ..units import is_quantity, to_km, R_EARTH_KM
 
 from functools import partial
 import numpy as np
-from astropy.units.quantity import Quantity
-from astropy.constants import R_earth
 
-from typing import Callable
+from typing import Callable, Sequence, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from astropy.units import Quantity
+
+
+def _boundary_radius(callback: Callable, lon, lat, dtype=float):
+    """
+    Evaluates a boundary-callback and returns its radius as plain np.array in km (of the given dtype).
+
+    Callbacks returning a Quantity of length are converted, plain values and dimensionless Quantities (as returned
+    by models computing with the lon/lat Quantities, e.g. np.cos(lat)) are considered to be in earth-radii. A
+    constant radius (a scalar) is broadcast to one value per sample, the returned array is always a writable buffer
+    of the shape of lon.
+    """
+    with stage('callback', len(lon), callback):
+        r = callback(lon, lat)[0]
+
+    with stage('units', len(lon)):
+        if is_quantity(r) and r.unit.physical_type == 'dimensionless':
+            radius = np.multiply(r.to_value(''), R_EARTH_KM, dtype=dtype)
+        elif is_quantity(r):
+            radius = np.array(to_km(r), dtype=dtype)
+        else:
+            radius = np.multiply(r, R_EARTH_KM, dtype=dtype)
+        if radius.shape != np.shape(lon):
+            radius = np.array(np.broadcast_to(radius, np.shape(lon)))
+        return radius
+
+
+# Relative width (in ulps of the trajectory's dtype) of the guard band of callback-boundaries for reduced
+# precision trajectories. The callbacks are evaluated on the stored angles, whose rounding (a few ulps of 2pi) is
+# amplified by the angular gradient of the boundary: 2048 ulps (2^-12 in single precision) cover boundaries whose
+# radius changes by up to ~80 times relative per radian (shue97 and conic_bow_shock stay below 10).
+CALLBACK_GUARD_BAND_ULPS = 2048
+
+
+def _spherical_km(trajectory: Trajectory):
+    """
+    Returns r (as plain np.array in km), lon and lat (as Quantities, passed to the callbacks) of a trajectory, in
+    its precision.
+    """
+    r = trajectory._spherical_km()[0]
+    with stage('units', len(r)):
+        return r, trajectory.lon, trajectory.lat
 
 
 class SphericalBoundary(Shape):
@@ -24,16 +69,19 @@ class SphericalBoundary(Shape):
     lower-bound has to be less than upper-bound if upper-bound is specified. A positive  lower-bound means that
     the selected range is actually outside the spherical object. A negative upper-bound means the range is
     inside the object.
+
+    If a coordinate_system is given trajectories of other coordinate systems are transformed to it.
     """
 
     def __init__(self, callback: Callable,
-                 lower_bound: Quantity = None,
-                 upper_bound: Quantity = None, **kwargs):
+                 lower_bound: 'Quantity' = None,
+                 upper_bound: 'Quantity' = None,
+                 coordinate_system: str = None, **kwargs):
         if lower_bound is None and upper_bound is None:
             raise ValueError("At least of one of lower or upper bound has to be specified.")
 
-        self._lower = lower_bound
-        self._upper = upper_bound
+        self._lower = float(to_km(lower_bound)) if lower_bound is not None else None
+        self._upper = float(to_km(upper_bound)) if upper_bound is not None else None
 
         if self._lower is not None and self._upper is not None:
             if self._lower > self._upper:
@@ -42,12 +90,47 @@ class SphericalBoundary(Shape):
 
         kwargs.update({'base': 'spherical'})  # force spherical basis, overriding user's request
         self._cb = partial(callback, **kwargs)
+        self.coordinate_system = coordinate_system
+
+    def _mask(self, r: np.ndarray, lon, lat, trajectory: Trajectory):
+        """
+        Evaluates the boundary for the given samples (r as plain np.array in km). The distance-buffer returned
+        by the callback is reused, the returned mask is the only new allocation in double precision.
+
+        Returns the mask and, for reduced precision trajectories, the points within the guard band (else None).
+        """
+        distances = _boundary_radius(self._cb, lon, lat, r.dtype)
+        np.subtract(r, distances, out=distances)
+
+        mask = np.ones(distances.shape, dtype=bool)
+        if self._lower is not None:
+            np.greater_equal(distances, self._lower, out=mask)
+        if self._upper is not None:
+            mask &= distances <= self._upper
+
+        if trajectory.dtype == np.float64:
+            return mask, None
+
+        # |distance - bound| <= band(r + |bound|), the band is linear in its scale: band(r) is computed once and
+        # band(|bound|) is subtracted from the deviation, both buffers are reused for the bounds
+        ambiguous = np.zeros(distances.shape, dtype=bool)
+        band = trajectory._guard_band(r, CALLBACK_GUARD_BAND_ULPS)
+        deviation = np.empty_like(distances)
+        for bound in (self._lower, self._upper):
+            if bound is not None:
+                np.subtract(distances, bound, out=deviation)
+                np.abs(deviation, out=deviation)
+                np.subtract(deviation, trajectory._guard_band(abs(bound), CALLBACK_GUARD_BAND_ULPS), out=deviation)
+                ambiguous |= deviation <= band
+        return mask, ambiguous
 
     def intersect(self, trajectory: Trajectory):
-        distances = trajectory.r - self._cb(trajectory.lon, trajectory.lat)[0] * R_earth
+        trajectory = self._in_frame(trajectory)
+        mask, ambiguous = self._mask(*_spherical_km(trajectory), trajectory)
 
-        return (distances >= self._lower if self._lower is not None else True) & \
-               (distances <= self._upper if self._upper is not None else True)
+        if ambiguous is not None:
+            mask = self._resolve(trajectory, mask, ambiguous)
+        return mask
 
 
 class Sheath(Shape):
@@ -58,22 +141,115 @@ class Sheath(Shape):
 
     In addition an inner and/or an outer margin can be specified which will also find points just outside
     the sheath within the margin.
+
+    Both boundaries are evaluated in a single pass: the spherical coordinates are read once and the outer
+    callback is only called for the points which are outside the inner boundary.
     """
 
     def __init__(self,
                  inner_callback: Callable,
                  outer_callback: Callable,
-                 inner_margin: Quantity = 0,
-                 outer_margin: Quantity = 0,
+                 inner_margin: 'Quantity' = 0,
+                 outer_margin: 'Quantity' = 0,
+                 coordinate_system: str = None,
                  **kwargs):
         if inner_margin is None or outer_margin is None or inner_margin < 0 or outer_margin < 0:
             raise ValueError("The margins have to be larger or equal to zero if specified.")
 
         self.inner_model = SphericalBoundary(inner_callback, -inner_margin, None, **kwargs)
         self.outer_model = SphericalBoundary(outer_callback, None, outer_margin, **kwargs)
+        self.coordinate_system = coordinate_system
+
+    def intersect(self, trajectory: Trajectory):
+        trajectory = self._in_frame(trajectory)
+        r, lon, lat = _spherical_km(trajectory)
+
+        mask, ambiguous = self.inner_model._mask(r, lon, lat, trajectory)
+        candidates = np.flatnonzero(mask)
+        mask[candidates], outer_ambiguous = self.outer_model._mask(r[candidates], lon[candidates], lat[candidates],
+                                                                   trajectory)
+
+        if ambiguous is not None:
+            ambiguous[candidates] |= outer_ambiguous
+            mask = self._resolve(trajectory, mask, ambiguous)
+        return mask
+
+
+class NestedBoundaries(Shape):
+    """
+    Labels each trajectory point with the region it is in with regard to a sequence of nested
+    spherical boundaries (e.g. magnetopause and bow-shock).
+
+    The callbacks have to be given from the innermost to the outermost boundary. A point inside the
+    innermost boundary gets the label 0, a point between boundary i-1 and i gets the label i and a point outside
+    of all boundaries gets the label len(callbacks). Optionally the regions can be named, names has then to have
+    one element more than there are callbacks, e.g. ('magnetosphere', 'magnetosheath', 'solar wind').
+
+    All labels are computed in a single pass: boundary i is only evaluated for the points which are outside
+    of boundary i-1.
+
+    If a region is given (by index or by name), intersect() returns the points inside this region, which
+    allows to use this shape like any other shape with broni.intervals().
+
+    kwargs passed to the constructor are forwarded to all callback-functions.
+    """
+
+    def __init__(self, *callbacks: Callable,
+                 names: Sequence[str] = None,
+                 region: Union[int, str] = None,
+                 coordinate_system: str = None,
+                 **kwargs):
+        if len(callbacks) == 0:
+            raise ValueError("At least one boundary-callback has to be specified.")
+
+        if len(callbacks) > 254:
+            raise ValueError("At most 254 nested boundaries are supported.")
+
+        if names is not None and len(names) != len(callbacks) + 1:
+            raise ValueError(f"{len(callbacks) + 1} region names are required for {len(callbacks)} boundaries.")
+
+        kwargs.update({'base': 'spherical'})
+        self._cbs = [partial(callback, **kwargs) for callback in callbacks]
+        self.names = tuple(names) if names is not None else None
+        self.region = self._region_index(region) if region is not None else None
+        self.coordinate_system = coordinate_system
+
+    def _region_index(self, region: Union[int, str]):
+        if isinstance(region, str):
+            if self.names is None or region not in self.names:
+                raise ValueError(f"Unknown region '{region}'.")
+            return self.names.index(region)
+
+        if not 0 <= region <= len(self._cbs):
+            raise ValueError(f"Region index {region} out of range, there are {len(self._cbs) + 1} regions.")
+        return region
+
+    def label(self, trajectory: Trajectory):
+        trajectory = self._in_frame(trajectory)
+        r, lon, lat = _spherical_km(trajectory)
+
+        labels = np.zeros(r.shape, dtype=np.uint8)
+        ambiguous = np.zeros(r.shape, dtype=bool) if trajectory.dtype != np.float64 else None
+
+        candidates = np.arange(len(r))
+        for i, cb in enumerate(self._cbs):
+            rc = r[candidates]
+            radius = _boundary_radius(cb, lon[candidates], lat[candidates], r.dtype)
+            if ambiguous is not None:
+                band = trajectory._guard_band(rc, CALLBACK_GUARD_BAND_ULPS)
+                ambiguous[candidates[np.abs(rc - radius) <= band]] = True
+
+            candidates = candidates[rc > radius]
+            labels[candidates] = i + 1
+
+        # labels are always resolved exactly, there is no conservative choice
+        if ambiguous is not None and ambiguous.any():
+            indices = np.flatnonzero(ambiguous)
+            labels[indices] = self.label(trajectory._subset(indices))
+        return labels
 
     def intersect(self, trajectory: Trajectory):
-        inner_mask = self.inner_model.intersect(trajectory)
-        outer_mask = self.outer_model.intersect(trajectory)
+        if self.region is None:
+            raise ValueError("A region has to be selected to use NestedBoundaries as a selection shape.")
 
-        return np.logical_and(inner_mask, outer_mask)
+        return self.label(trajectory) == self.region
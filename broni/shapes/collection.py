@@ -0,0 +1,216 @@
+from . import Shape
+from .primitives import Sphere, Cuboid
+from .. import Trajectory, Intervals
+
+from ..units import to_km
+
+import numpy as np
+
+from typing import List, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from astropy.units import Quantity
+
+# shapes extending over more than this number of cells are not registered in the grid
+_LARGE_CELLS = 8
+
+
+def _expand(counts: np.ndarray):
+    """
+    For each i, enumerates 0 .. counts[i] - 1. Returns the owner i and the local index of each element.
+    """
+    owners = np.repeat(np.arange(len(counts)), counts)
+    return owners, np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+
+def _cells_of_boxes(cell_lo: np.ndarray, cell_hi: np.ndarray):
+    """
+    Enumerates all grid-cells covered by the boxes [cell_lo, cell_hi] (inclusive integer cell-coordinates of
+    shape (M, D)). Returns the box-index and the cell-coordinates of each covered cell.
+    """
+    extent = cell_hi - cell_lo + 1
+    owners, local = _expand(np.prod(extent, axis=1))
+    ext = extent[owners]
+
+    cells = np.empty((len(owners), extent.shape[1]), dtype=cell_lo.dtype)
+    for axis in reversed(range(extent.shape[1])):
+        cells[:, axis] = cell_lo[owners, axis] + local % ext[:, axis]
+        local = local // ext[:, axis]
+    return owners, cells
+
+
+class ShapeCollection(Shape):
+    """
+    A large number of Spheres and/or Cuboids (e.g. regions around a catalogue of events) which are tested
+    against a trajectory at once.
+
+    The shapes' bounding boxes are registered in a uniform grid. For each trajectory point only the shapes
+    registered in the point's grid-cell are tested exactly, which is found by a binary search over the
+    occupied cells. The cost is therefore close to O(N log M + hits) instead of O(N * M) for N trajectory points
+    and M shapes.
+
+    By default the cell-size is the median of the shapes' largest bounding-box extent. Shapes extending over
+    more than a few cells (which would be registered in very many cells) are kept out of the grid, they are
+    tested against all points by their bounding box first. For catalogues with very different shape-sizes it
+    may be better to specify the cell-size.
+
+    Used as a shape in broni.intervals() a ShapeCollection selects the points inside any of its shapes.
+    interval_table() and intervals() report the intervals for each individual shape.
+
+    All shapes of a collection have to be defined in the same coordinate system, or all of them in none (they are
+    then evaluated in the coordinate system of the trajectory). Mixing both raises a ValueError.
+
+    The trajectory is processed in chunks of chunk_size points to limit the memory used by the candidate pairs.
+    """
+
+    def __init__(self, shapes: List[Union[Sphere, Cuboid]], cell_size: 'Quantity' = None, chunk_size: int = 1 << 16):
+        self._shapes = list(shapes)
+        self._chunk_size = chunk_size
+
+        for shape in self._shapes:
+            if not isinstance(shape, (Sphere, Cuboid)):
+                raise TypeError(f"ShapeCollection supports Spheres and Cuboids only, got {type(shape).__name__}.")
+
+        # a frameless shape is evaluated in the trajectory's coordinate system, it cannot share a frame with others
+        frames = {shape.coordinate_system.lower() if shape.coordinate_system is not None else None
+                  for shape in self._shapes}
+        if len(frames) > 1:
+            raise ValueError(f"All shapes have to be defined in the same coordinate system (or all in none), "
+                             f"got {sorted(frames, key=str)}.")
+        self.coordinate_system = frames.pop() if frames else None
+
+        self._lo = np.empty((len(self._shapes), 3))
+        self._hi = np.empty((len(self._shapes), 3))
+        for i, shape in enumerate(self._shapes):
+            self._lo[i], self._hi[i] = shape.bounding_box()
+
+        self._is_sphere = np.array([isinstance(shape, Sphere) for shape in self._shapes], dtype=bool)
+        self._center = (self._lo + self._hi) / 2
+        self._radius = np.zeros(len(self._shapes))
+        for i in np.flatnonzero(self._is_sphere):
+            self._center[i], self._radius[i] = self._shapes[i]._center, self._shapes[i]._radius
+        self._radius2 = self._radius ** 2
+
+        if len(self._shapes) == 0:
+            return
+
+        if cell_size is not None:
+            self._cell = float(to_km(cell_size))
+        else:
+            self._cell = np.median(np.max(self._hi - self._lo, axis=1))
+        if self._cell <= 0:
+            raise ValueError("The cell-size has to be greater than 0.")
+
+        large = np.max(self._hi - self._lo, axis=1) > _LARGE_CELLS * self._cell
+        self._large = np.flatnonzero(large)
+        gridded = np.flatnonzero(~large)
+
+        self._origin = self._lo[gridded].min(axis=0) if len(gridded) else np.zeros(3)
+        cell_lo = np.floor((self._lo[gridded] - self._origin) / self._cell).astype(np.int64)
+        cell_hi = np.floor((self._hi[gridded] - self._origin) / self._cell).astype(np.int64)
+        self._dims = cell_hi.max(axis=0) + 1 if len(gridded) else np.ones(3, dtype=np.int64)
+
+        shape_ids, cells = _cells_of_boxes(cell_lo, cell_hi)
+        shape_ids = gridded[shape_ids]
+
+        keys = self._keys(cells)
+        order = np.argsort(keys, kind='stable')
+        self._cell_keys, self._cell_starts = np.unique(keys[order], return_index=True)
+        self._cell_stops = np.append(self._cell_starts[1:], len(order))
+        self._cell_shapes = shape_ids[order]
+
+    @property
+    def shapes(self):
+        if self._shapes is None:
+            self._shapes = [Sphere(*center, radius, self.coordinate_system) if is_sphere else
+                            Cuboid(*lo, *hi, self.coordinate_system)
+                            for is_sphere, center, radius, lo, hi in
+                            zip(self._is_sphere, self._center, self._radius, self._lo, self._hi)]
+        return self._shapes
+
+    def __getstate__(self):
+        # the shapes are described by the arrays of the grid, they are rebuilt from them when accessed
+        state = self.__dict__.copy()
+        state['_shapes'] = None
+        return state
+
+    def _keys(self, cells: np.ndarray):
+        return (cells[:, 0] * self._dims[1] + cells[:, 1]) * self._dims[2] + cells[:, 2]
+
+    def _hits(self, trajectory: Trajectory):
+        """
+        Returns the (point-index, shape-index) pairs of all points inside a shape, ordered by point-index.
+        """
+        empty = np.empty(0, dtype=np.intp)
+        if len(self._is_sphere) == 0 or len(trajectory) == 0:
+            return empty, empty
+
+        points = self._in_frame(trajectory)._cartesian_km()
+        hits = [self._chunk_hits(points[i:i + self._chunk_size], i) for i in range(0, len(points), self._chunk_size)]
+        return np.concatenate([h[0] for h in hits]), np.concatenate([h[1] for h in hits])
+
+    def _chunk_hits(self, points: np.ndarray, offset: int):
+        cells = np.floor((points - self._origin) / self._cell).astype(np.int64)
+        in_grid = np.flatnonzero(np.all((cells >= 0) & (cells < self._dims), axis=1))
+
+        keys = self._keys(cells[in_grid])
+        pos = np.minimum(np.searchsorted(self._cell_keys, keys), max(len(self._cell_keys) - 1, 0))
+        found = self._cell_keys[pos] == keys if len(self._cell_keys) else np.zeros(len(keys), dtype=bool)
+        in_grid, pos = in_grid[found], pos[found]
+
+        # candidate pairs: each point with every shape registered in its cell
+        owners, local = _expand(self._cell_stops[pos] - self._cell_starts[pos])
+        point_ids = in_grid[owners]
+        shape_ids = self._cell_shapes[self._cell_starts[pos][owners] + local]
+
+        if len(self._large):
+            # and the points with the shapes which are not in the grid, within their bounding box
+            large_points = [np.flatnonzero(np.all((points >= self._lo[i]) & (points <= self._hi[i]), axis=1))
+                            for i in self._large]
+            large_shapes = [np.full(len(ids), i) for i, ids in zip(self._large, large_points)]
+            point_ids = np.concatenate([point_ids] + large_points)
+            shape_ids = np.concatenate([shape_ids] + large_shapes)
+            order = np.argsort(point_ids, kind='stable')
+            point_ids, shape_ids = point_ids[order], shape_ids[order]
+
+        p = points[point_ids]
+        inside = np.all((p >= self._lo[shape_ids]) & (p <= self._hi[shape_ids]), axis=1)
+        spheres = np.flatnonzero(inside & self._is_sphere[shape_ids])
+        d = p[spheres] - self._center[shape_ids[spheres]]
+        inside[spheres] = np.einsum('ij,ij->i', d, d) <= self._radius2[shape_ids[spheres]]
+
+        return point_ids[inside] + offset, shape_ids[inside]
+
+    def intersect(self, trajectory: Trajectory):
+        mask = np.zeros(len(trajectory), dtype=bool)
+        mask[self._hits(trajectory)[0]] = True
+        return mask
+
+    def interval_table(self, trajectory: Trajectory):
+        """
+        Returns the intervals during which the trajectory was inside each of the shapes, as broni.Intervals with
+        an additional 'shape'-column containing the index of the shape in the collection. The intervals are
+        ordered by shape-index and time.
+        """
+        point_ids, shape_ids = self._hits(trajectory)
+
+        order = np.argsort(shape_ids, kind='stable')
+        point_ids, shape_ids = point_ids[order], shape_ids[order]
+
+        breaks = np.flatnonzero((np.diff(point_ids) != 1) | (np.diff(shape_ids) != 0)) + 1
+        starts = np.concatenate(([0], breaks)) if len(point_ids) else breaks
+        stops = np.concatenate((breaks - 1, [len(point_ids) - 1])) if len(point_ids) else breaks
+
+        return Intervals(trajectory, point_ids[starts], point_ids[stops], statistics={'shape': shape_ids[starts]})
+
+    def intervals(self, trajectory: Trajectory):
+        """
+        Returns a dict mapping the index of each shape the trajectory passed through to the list of its
+        (start, stop)-intervals.
+        """
+        table = self.interval_table(trajectory)
+
+        result = {}
+        for shape, start, stop in zip(table.statistics['shape'], table.start, table.stop):
+            result.setdefault(int(shape), []).append((start, stop))
+        return result
@@ -0,0 +1,161 @@
+from . import Shape
+from .collection import _expand, _cells_of_boxes
+from .. import Trajectory
+
+from ..units import to_km, quantity
+
+import numpy as np
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from astropy.units import Quantity
+
+
+class MeshShape(Shape):
+    """
+    A closed triangulated surface (e.g. an isosurface of a MHD simulation or an empirical 3D boundary fit) given by
+    its vertices (Quantity of shape (V, 3)) and faces (integer array of shape (F, 3), indexing the vertices).
+    intersect() selects the points inside the surface. The mesh has to be watertight, the orientation of the
+    faces does not matter.
+
+    Inside-tests are done by counting the crossings of a ray in +z-direction with the surface (odd means inside).
+    The triangles are registered in a 2D-grid over x/y so that each point is only tested against the triangles
+    above and below it. In addition a voxel-grid of resolution^3 cells over the bounding box of the mesh is
+    precomputed: voxels not touched by any triangle are entirely inside or outside, only the points in voxels
+    touched by the surface are tested against the triangles.
+    """
+
+    def __init__(self, vertices: 'Quantity', faces: np.ndarray, resolution: int = 64,
+                 coordinate_system: str = None, chunk_size: int = 1 << 16):
+        vertices = to_km(vertices)
+        faces = np.asarray(faces, dtype=np.intp)
+
+        if vertices.ndim != 2 or vertices.shape[1] != 3 or faces.ndim != 2 or faces.shape[1] != 3:
+            raise ValueError("vertices and faces have to be of shape (V, 3) and (F, 3).")
+        if len(faces) == 0:
+            raise ValueError("A MeshShape needs at least one face.")
+        if resolution < 1:
+            raise ValueError("The resolution has to be at least 1.")
+
+        self._vertices = vertices
+        self.faces = faces
+        self.coordinate_system = coordinate_system
+        self._chunk_size = chunk_size
+
+        a, b, c = vertices[faces[:, 0]], vertices[faces[:, 1]], vertices[faces[:, 2]]
+        self._lo = vertices[faces].min(axis=(0, 1))
+        self._hi = vertices[faces].max(axis=(0, 1))
+
+        self._build_triangle_grid(a, b, c)
+        self._build_voxel_grid(a, b, c, resolution)
+
+    @property
+    def vertices(self):
+        return quantity(self._vertices)
+
+    def bounding_box(self):
+        """
+        Returns the lower and upper corner of the axis-aligned bounding box (as np.array in km).
+        """
+        return self._lo.copy(), self._hi.copy()
+
+    def _build_triangle_grid(self, a, b, c):
+        # triangles parallel to z (zero area in the x/y-projection) are never crossed by a ray in z-direction
+        area2 = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+        keep = area2 != 0
+        a, b, c, area2 = a[keep], b[keep], c[keep], area2[keep]
+
+        # orient all projected triangles counter-clockwise, required by the tie-breaking rule in _crossings()
+        cw = area2 < 0
+        b[cw], c[cw] = c[cw], b[cw].copy()
+        self._tri = np.stack((a, b, c), axis=1)
+        self._area2 = np.abs(area2)
+
+        lo, hi = self._tri[:, :, :2].min(axis=1), self._tri[:, :, :2].max(axis=1)
+        cells = max(1, int(np.sqrt(len(self._tri))))
+        self._xy_origin = self._lo[:2]
+        self._xy_cell = np.maximum((self._hi[:2] - self._lo[:2]) / cells, np.finfo(float).tiny)
+        self._xy_dims = np.full(2, cells, dtype=np.int64)
+
+        tri_ids, xy = _cells_of_boxes(self._xy_cells(lo), self._xy_cells(hi))
+        keys = xy[:, 0] * cells + xy[:, 1]
+        order = np.argsort(keys, kind='stable')
+        self._xy_keys, self._xy_starts = np.unique(keys[order], return_index=True)
+        self._xy_stops = np.append(self._xy_starts[1:], len(order))
+        self._xy_tris = tri_ids[order]
+
+    def _xy_cells(self, xy: np.ndarray):
+        return np.clip(np.floor((xy - self._xy_origin) / self._xy_cell).astype(np.int64), 0, self._xy_dims - 1)
+
+    def _build_voxel_grid(self, a, b, c, resolution):
+        self._voxel = np.maximum((self._hi - self._lo) / resolution, np.finfo(float).tiny)
+        self._voxel_dims = np.full(3, resolution, dtype=np.int64)
+
+        # voxels touched by the bounding box of a triangle are boundary-voxels (conservative)
+        lo = np.minimum(np.minimum(a, b), c)
+        hi = np.maximum(np.maximum(a, b), c)
+        _, cells = _cells_of_boxes(self._voxel_cells(lo), self._voxel_cells(hi))
+        boundary = np.zeros((resolution,) * 3, dtype=bool)
+        boundary[cells[:, 0], cells[:, 1], cells[:, 2]] = True
+
+        # all other voxels are classified by their center
+        self._voxel_inside = np.zeros((resolution,) * 3, dtype=bool)
+        others = np.argwhere(~boundary)
+        centers = self._lo + (others + 0.5) * self._voxel
+        self._voxel_inside[tuple(others.T)] = self._inside(centers)
+        self._voxel_boundary = boundary
+
+    def _voxel_cells(self, xyz: np.ndarray):
+        return np.clip(np.floor((xyz - self._lo) / self._voxel).astype(np.int64), 0, self._voxel_dims - 1)
+
+    def _crossings(self, points: np.ndarray):
+        """
+        Number of crossings of the ray from each point in +z-direction with the surface.
+        """
+        xy = self._xy_cells(points[:, :2])
+        keys = xy[:, 0] * self._xy_dims[1] + xy[:, 1]
+        pos = np.minimum(np.searchsorted(self._xy_keys, keys), len(self._xy_keys) - 1)
+        found = np.flatnonzero(self._xy_keys[pos] == keys)
+
+        owners, local = _expand(self._xy_stops[pos[found]] - self._xy_starts[pos[found]])
+        point_ids = found[owners]
+        tri = self._tri[self._xy_tris[self._xy_starts[pos[found]][owners] + local]]
+        p = points[point_ids]
+
+        # edge-functions of the projected (counter-clockwise) triangles; points on an edge shared by two triangles
+        # are attributed to exactly one of them (the edge is traversed in opposite directions)
+        inside = np.ones(len(point_ids), dtype=bool)
+        weights = []
+        for i, j in ((1, 2), (2, 0), (0, 1)):
+            e = tri[:, j, :2] - tri[:, i, :2]
+            w = e[:, 0] * (p[:, 1] - tri[:, i, 1]) - e[:, 1] * (p[:, 0] - tri[:, i, 0])
+            inside &= (w > 0) | ((w == 0) & ((e[:, 1] > 0) | ((e[:, 1] == 0) & (e[:, 0] < 0))))
+            weights.append(w)
+
+        # z of the triangle-plane above/below the point, interpolated with the barycentric weights
+        w = np.stack(weights, axis=1)[inside]
+        tri = tri[inside]
+        z = np.einsum('ij,ij->i', w, tri[:, :, 2]) / w.sum(axis=1)
+        crossing = z > p[inside, 2]
+
+        return np.bincount(point_ids[inside][crossing], minlength=len(points))
+
+    def _inside(self, points: np.ndarray):
+        result = np.empty(len(points), dtype=bool)
+        for i in range(0, len(points), self._chunk_size):
+            result[i:i + self._chunk_size] = self._crossings(points[i:i + self._chunk_size]) % 2 == 1
+        return result
+
+    def intersect(self, trajectory: Trajectory):
+        points = self._in_frame(trajectory)._cartesian_km()
+
+        mask = np.zeros(len(points), dtype=bool)
+        candidates = np.flatnonzero(np.all((points >= self._lo) & (points <= self._hi), axis=1))
+
+        voxels = tuple(self._voxel_cells(points[candidates]).T)
+        mask[candidates] = self._voxel_inside[voxels]
+
+        boundary = candidates[self._voxel_boundary[voxels]]
+        mask[boundary] = self._inside(points[boundary])
+        return mask
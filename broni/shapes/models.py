@@ -0,0 +1,73 @@
+"""
+Named boundary models which can be referenced by name in shape specifications (see broni.shapes.spec).
+
+A model is a callback as used by SphericalBoundary, Sheath and NestedBoundaries: it is called with longitude
+and latitude (as Quantities or np.arrays in radians) and its parameters as keyword arguments and returns
+(r, lon, lat). The radius is returned in earth-radii (or as a Quantity).
+"""
+
+import numpy as np
+
+from typing import Callable
+
+MODELS = {}
+
+
+def register_model(name: str, callback: Callable = None):
+    """
+    Registers a boundary model under a name. Can be used as a decorator (register_model('name')).
+    """
+    if callback is None:
+        return lambda cb: register_model(name, cb)
+
+    if name in MODELS and MODELS[name] is not callback:
+        raise ValueError(f"A model named '{name}' is already registered.")
+    MODELS[name] = callback
+    return callback
+
+
+def get_model(name: str):
+    if name not in MODELS:
+        raise ValueError(f"Unknown model '{name}', registered models are {sorted(MODELS)}.")
+    return MODELS[name]
+
+
+def model_name(callback: Callable):
+    """
+    Name under which a callback is registered, None if it is not a registered model.
+    """
+    return next((name for name, model in MODELS.items() if model is callback), None)
+
+
+def _cos_angle_to_x(lon, lat):
+    """
+    Cosine of the angle between the direction (lon, lat) and the x-axis (the sun-earth line in GSE/GSM).
+    """
+    return np.asarray(np.cos(lat) * np.cos(lon))
+
+
+@register_model('shue97')
+def shue97(lon, lat, r0: float = None, alpha: float = None, bz: float = 0.0, pdyn: float = 2.0, **kwargs):
+    """
+    Magnetopause of Shue et al. (1997): r = r0 * (2 / (1 + cos(theta))) ** alpha.
+
+    r0 (earth-radii) and alpha are derived from the IMF bz (nT) and the solar-wind dynamic pressure pdyn (nPa)
+    unless given. The tail is open, the radius is limited to stay finite behind the earth.
+    """
+    if r0 is None:
+        r0 = (11.4 + (0.013 if bz >= 0 else 0.14) * bz) * pdyn ** (-1 / 6.6)
+    if alpha is None:
+        alpha = (0.58 - 0.010 * bz) * (1 + 0.010 * pdyn)
+
+    cos_theta = np.maximum(_cos_angle_to_x(lon, lat), -0.99)
+    return r0 * (2 / (1 + cos_theta)) ** alpha, lon, lat
+
+
+@register_model('conic_bow_shock')
+def conic_bow_shock(lon, lat, r0: float = 13.7, eccentricity: float = 0.81, **kwargs):
+    """
+    Conic bow-shock with its focus at the earth: r = r0 * (1 + e) / (1 + e * cos(theta)), r0 is the stand-off
+    distance in earth-radii (the defaults are those of Farris et al. (1991)).
+    """
+    cos_theta = np.maximum(_cos_angle_to_x(lon, lat), -0.95)
+    return r0 * (1 + eccentricity) / (1 + eccentricity * cos_theta), lon, lat
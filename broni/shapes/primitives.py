@@ -1,45 +1,118 @@
 from . import Shape
 from .. import Trajectory
+from ..units import to_km, quantity
 
 import numpy as np
-from astropy.units.quantity import Quantity
-from astropy.units import km
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from astropy.units import Quantity
 
 
 class Sphere(Shape):
-    def __init__(self, x: Quantity, y: Quantity, z: Quantity, r: Quantity):
+    def __init__(self, x: 'Quantity', y: 'Quantity', z: 'Quantity', r: 'Quantity', coordinate_system: str = None):
         if r <= 0:
             raise ValueError("r has to be greater than 0 to define a sphere")
 
-        self.center = np.array((x.to('km').value, y.to('km').value, z.to('km').value)) * km
-        self.radius = r.to('km')
+        self._center = np.array((to_km(x), to_km(y), to_km(z)))
+        self._radius = float(to_km(r))
+        self.coordinate_system = coordinate_system
+
+    @property
+    def center(self):
+        return quantity(self._center)
+
+    @property
+    def radius(self):
+        return quantity(self._radius)
+
+    def bounding_box(self):
+        """
+        Returns the lower and upper corner of the axis-aligned bounding box (as np.array in km).
+        """
+        return self._center - self._radius, self._center + self._radius
 
     def intersect(self, trajectory: Trajectory):
-        dist = np.linalg.norm(self.center - trajectory.cartesian, axis=1)
-        return dist <= self.radius
+        trajectory = self._in_frame(trajectory)
+        cartesian = trajectory._cartesian_km()
+
+        d = self._center.astype(cartesian.dtype) - cartesian
+        dist2 = np.einsum('ij,ij->i', d, d)
+        mask = dist2 <= self._radius ** 2
+
+        band = trajectory._guard_band((np.linalg.norm(self._center) + self._radius) ** 2)
+        if band:
+            mask = self._resolve(trajectory, mask, np.abs(dist2 - self._radius ** 2) <= band)
+        return mask
 
 
 class Cuboid(Shape):
-    def __init__(self, x0: Quantity, y0: Quantity, z0: Quantity, x1: Quantity, y1: Quantity, z1: Quantity):
-        self.p1 = np.array((x0.to('km').value, y0.to('km').value, z0.to('km').value), dtype=float) * km
-        self.p2 = np.array((x1.to('km').value, y0.to('km').value, z0.to('km').value), dtype=float) * km
-        self.p3 = np.array((x0.to('km').value, y1.to('km').value, z0.to('km').value), dtype=float) * km
-        self.p4 = np.array((x0.to('km').value, y0.to('km').value, z1.to('km').value), dtype=float) * km
+    def __init__(self, x0: 'Quantity', y0: 'Quantity', z0: 'Quantity', x1: 'Quantity', y1: 'Quantity', z1: 'Quantity',
+                 coordinate_system: str = None):
+        x0, y0, z0, x1, y1, z1 = (float(to_km(v)) for v in (x0, y0, z0, x1, y1, z1))
+
+        self._p1 = np.array((x0, y0, z0), dtype=float)
+        self._p2 = np.array((x1, y0, z0), dtype=float)
+        self._p3 = np.array((x0, y1, z0), dtype=float)
+        self._p4 = np.array((x0, y0, z1), dtype=float)
 
         if (x0, y0, z0) == (x1, y1, z1):
             raise ValueError("p0 is equal to p1, a Cuboid of zero volume is not supported.")
 
+        self.coordinate_system = coordinate_system
+
+    @property
+    def p1(self):
+        return quantity(self._p1)
+
+    @property
+    def p2(self):
+        return quantity(self._p2)
+
+    @property
+    def p3(self):
+        return quantity(self._p3)
+
+    @property
+    def p4(self):
+        return quantity(self._p4)
+
+    def bounding_box(self):
+        """
+        Returns the lower and upper corner of the axis-aligned bounding box (as np.array in km).
+        """
+        p1 = np.array((self._p2[0], self._p3[1], self._p4[2]))
+        return np.minimum(self._p1, p1), np.maximum(self._p1, p1)
+
     def intersect(self, trajectory: Trajectory):
+        trajectory = self._in_frame(trajectory)
+        cartesian = trajectory._cartesian_km()
+
         def f(b):
-            v = self.p1 - b
-            vp1, vb = sorted([np.dot(v, p) for p in (self.p1, b)])
-            o = np.dot(trajectory.cartesian, v)
-            return vp1, vb, o
-
-        u_p1, u_p2, uO = f(self.p2)
-        v_p1, v_p3, vO = f(self.p3)
-        w_p1, w_p4, wO = f(self.p4)
-
-        return np.logical_and.reduce((u_p1 <= uO, uO <= u_p2,
-                                      v_p1 <= vO, vO <= v_p3,
-                                      w_p1 <= wO, wO <= w_p4))
+            v = self._p1 - b
+            vp1, vb = sorted([float(np.dot(v, p)) for p in (self._p1, b)])
+            o = np.dot(cartesian, v.astype(cartesian.dtype))
+            band = trajectory._guard_band((np.linalg.norm(self._p1) + np.linalg.norm(v)) * np.linalg.norm(v))
+            return vp1, vb, o, band
+
+        u_p1, u_p2, uO, ub = f(self._p2)
+        v_p1, v_p3, vO, vb = f(self._p3)
+        w_p1, w_p4, wO, wb = f(self._p4)
+
+        if trajectory.dtype == np.float64:
+            return np.logical_and.reduce((u_p1 <= uO, uO <= u_p2,
+                                          v_p1 <= vO, vO <= v_p3,
+                                          w_p1 <= wO, wO <= w_p4))
+
+        # points inside the cuboid shrunk by the guard band are inside, points outside of the cuboid widened by
+        # the guard band are outside, the points in-between are ambiguous
+        mask = np.logical_and.reduce((u_p1 + ub <= uO, uO <= u_p2 - ub,
+                                      v_p1 + vb <= vO, vO <= v_p3 - vb,
+                                      w_p1 + wb <= wO, wO <= w_p4 - wb))
+        ambiguous = np.logical_and.reduce((u_p1 - ub <= uO, uO <= u_p2 + ub,
+                                           v_p1 - vb <= vO, vO <= v_p3 + vb,
+                                           w_p1 - wb <= wO, wO <= w_p4 + wb))
+        ambiguous &= ~mask
+        mask = self._resolve(trajectory, mask, ambiguous)
+        return mask
@@ -0,0 +1,148 @@
+"""
+Declarative shape specifications: shapes described by plain dicts (or their JSON-form), e.g.
+
+    {"type": "sphere", "center": [60000, 0, 0], "radius": 6000, "coordinate_system": "gse"}
+    {"type": "cuboid", "corners": [[30000, -30000, -30000], [90000, 30000, 30000]]}
+    {"type": "boundary", "model": "shue97", "parameters": {"pdyn": 3}, "lower_bound": -3000, "upper_bound": 3000}
+    {"type": "sheath", "inner": {"model": "shue97"}, "outer": {"model": "conic_bow_shock"}, "outer_margin": 1000}
+    {"type": "nested", "boundaries": [{"model": "shue97"}, {"model": "conic_bow_shock"}],
+     "names": ["magnetosphere", "magnetosheath", "solar wind"], "region": "magnetosheath"}
+    {"type": "collection", "shapes": [<sphere- or cuboid-specification>, ...], "cell_size": 6000}
+    {"type": "mesh", "vertices": [[x, y, z], ...], "faces": [[0, 1, 2], ...], "resolution": 64}
+
+All lengths are in km. Boundaries reference a model of broni.shapes.models by name (and its parameters).
+
+to_spec() gives the specification of a shape, which works for all shapes but the ones using callbacks which are
+not registered models.
+"""
+
+import json
+from functools import partial
+
+from . import Shape
+from .primitives import Sphere, Cuboid
+from .callback import SphericalBoundary, Sheath, NestedBoundaries
+from .collection import ShapeCollection
+from .mesh import MeshShape
+from .models import get_model, model_name
+
+from typing import Callable, Union
+
+
+def _get(spec: dict, key: str):
+    if key not in spec:
+        raise ValueError(f"'{key}' is missing in the {spec.get('type')}-specification.")
+    return spec[key]
+
+
+def _model(spec: dict):
+    return partial(get_model(_get(spec, 'model')), **spec.get('parameters', {}))
+
+
+def _sphere(spec: dict):
+    return Sphere(*_get(spec, 'center'), _get(spec, 'radius'), spec.get('coordinate_system'))
+
+
+def _cuboid(spec: dict):
+    p0, p1 = _get(spec, 'corners')
+    return Cuboid(*p0, *p1, spec.get('coordinate_system'))
+
+
+def _boundary(spec: dict):
+    return SphericalBoundary(_model(spec), spec.get('lower_bound'), spec.get('upper_bound'),
+                             spec.get('coordinate_system'))
+
+
+def _sheath(spec: dict):
+    return Sheath(_model(_get(spec, 'inner')), _model(_get(spec, 'outer')),
+                  spec.get('inner_margin', 0), spec.get('outer_margin', 0), spec.get('coordinate_system'))
+
+
+def _nested(spec: dict):
+    return NestedBoundaries(*[_model(boundary) for boundary in _get(spec, 'boundaries')],
+                            names=spec.get('names'), region=spec.get('region'),
+                            coordinate_system=spec.get('coordinate_system'))
+
+
+def _collection(spec: dict):
+    return ShapeCollection([from_spec(shape) for shape in _get(spec, 'shapes')], spec.get('cell_size'))
+
+
+def _mesh(spec: dict):
+    return MeshShape(_get(spec, 'vertices'), _get(spec, 'faces'), spec.get('resolution', 64),
+                     spec.get('coordinate_system'))
+
+
+_BUILDERS = {
+    'sphere': _sphere,
+    'cuboid': _cuboid,
+    'boundary': _boundary,
+    'sheath': _sheath,
+    'nested': _nested,
+    'collection': _collection,
+    'mesh': _mesh,
+}
+
+
+def from_spec(spec: Union[dict, str]) -> Shape:
+    """
+    Builds a shape from its specification (a dict or a JSON-string).
+    """
+    if isinstance(spec, str):
+        spec = json.loads(spec)
+
+    if not isinstance(spec, dict) or spec.get('type') not in _BUILDERS:
+        raise ValueError(f"Invalid shape-specification {spec!r}, the type has to be one of {sorted(_BUILDERS)}.")
+    return _BUILDERS[spec['type']](spec)
+
+
+def _model_spec(callback: Callable):
+    name = model_name(callback.func) if isinstance(callback, partial) else None
+    if name is None:
+        raise ValueError(f"{callback!r} is not a registered model, a specification cannot be given.")
+
+    parameters = {key: value for key, value in callback.keywords.items() if key != 'base'}
+    return {'model': name, 'parameters': parameters} if parameters else {'model': name}
+
+
+def _spec(shape: Shape, kind: str, **fields):
+    spec = {'type': kind}
+    spec.update((key, value) for key, value in fields.items() if value is not None)
+    if shape.coordinate_system is not None:
+        spec['coordinate_system'] = shape.coordinate_system
+    return spec
+
+
+def to_spec(shape: Shape) -> dict:
+    """
+    Specification of a shape (a dict which can be serialized to JSON), see from_spec().
+    """
+    if isinstance(shape, Sphere):
+        return _spec(shape, 'sphere', center=shape._center.tolist(), radius=shape._radius)
+
+    if isinstance(shape, Cuboid):
+        return _spec(shape, 'cuboid', corners=[corner.tolist() for corner in shape.bounding_box()])
+
+    if isinstance(shape, SphericalBoundary):
+        return _spec(shape, 'boundary', **_model_spec(shape._cb),
+                     lower_bound=shape._lower, upper_bound=shape._upper)
+
+    if isinstance(shape, Sheath):
+        return _spec(shape, 'sheath',
+                     inner=_model_spec(shape.inner_model._cb), outer=_model_spec(shape.outer_model._cb),
+                     inner_margin=abs(shape.inner_model._lower), outer_margin=shape.outer_model._upper)
+
+    if isinstance(shape, NestedBoundaries):
+        return _spec(shape, 'nested', boundaries=[_model_spec(cb) for cb in shape._cbs],
+                     names=list(shape.names) if shape.names is not None else None, region=shape.region)
+
+    if isinstance(shape, ShapeCollection):
+        # the coordinate system is given by the shapes of the collection
+        return {'type': 'collection', 'shapes': [to_spec(s) for s in shape.shapes],
+                'cell_size': getattr(shape, '_cell', None)}
+
+    if isinstance(shape, MeshShape):
+        return _spec(shape, 'mesh', vertices=shape._vertices.tolist(), faces=shape.faces.tolist(),
+                     resolution=int(shape._voxel_dims[0]))
+
+    raise ValueError(f"No specification for shapes of type {type(shape).__name__}.")
@@ -0,0 +1,30 @@
+"""
+Unit handling without importing astropy at import-time: Quantities are recognized by duck-typing and converted
+to plain np.arrays in km for the computations, astropy is only imported when Quantities have to be created.
+
+Plain numbers and arrays are considered to be in km.
+"""
+
+import numpy as np
+
+R_EARTH_KM = 6378.1  # nominal equatorial radius (IAU 2015 Resolution B3), same as astropy.constants.R_earth
+
+
+def is_quantity(value):
+    return hasattr(value, 'unit') and hasattr(value, 'to_value')
+
+
+def to_km(value, dtype=float):
+    if is_quantity(value):
+        value = value.to_value('km')
+    return np.asarray(value, dtype=dtype)
+
+
+def quantity(value, unit: str = 'km'):
+    """
+    Returns value as Quantity of the given unit, float-arrays are not copied.
+    """
+    from astropy import units
+    if isinstance(value, np.ndarray) and value.dtype.kind == 'f':
+        return units.Quantity(value, units.Unit(unit), copy=False)
+    return units.Quantity(value, units.Unit(unit))
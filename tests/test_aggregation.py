@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+import unittest
+from ddt import ddt, data, unpack
+
+import numpy as np
+
+import broni
+from broni.shapes.primitives import Cuboid, Sphere
+
+
+def orbit(n=3000, numeric=False):
+    phase = np.linspace(0, 10 * np.pi, n)
+    radius = 10 + 3 * np.cos(phase / 4)
+    x, y, z = radius * np.cos(phase), radius * np.sin(phase), np.sin(phase / 3)
+    if numeric:
+        time = np.cumsum(np.random.default_rng(0).uniform(0.5, 2, n))
+    else:
+        time = np.datetime64('2020-01-01') + np.cumsum(np.random.default_rng(0).integers(30, 90, n)).astype(
+            'timedelta64[s]')
+    return broni.Trajectory(x, y, z, time, 'gse')
+
+
+def steps(time):
+    steps = np.diff(time)
+    steps = np.append(steps, steps[-1])
+    return steps / np.timedelta64(1, 's') if steps.dtype.kind == 'm' else steps
+
+
+SHAPES = {'sphere': Sphere(10, 0, 0, 4),
+          'box': [Cuboid(-15, -15, -0.5, 15, 15, 0.5), Sphere(0, 0, 0, 11)]}
+
+
+@ddt
+class TestAggregation(unittest.TestCase):
+    @data(1, 7, 100, 10000)
+    def test_intervals_dwell_time_and_samples(self, chunk_size):
+        trajectory = orbit()
+        result = broni.aggregate(trajectory, SHAPES, chunk_size=chunk_size)
+
+        self.assertEqual(result.names, ('sphere', 'box'))
+        for name in SHAPES:
+            mask = broni._intersect_all(trajectory, broni._listify(SHAPES[name]))
+            k = result.index(name)
+
+            self.assertEqual(result.intervals[name].to_list(), broni.intervals(trajectory, SHAPES[name]))
+            self.assertEqual(result.samples[k], np.count_nonzero(mask))
+            self.assertAlmostEqual(result.dwell_time[k], steps(trajectory.time_index)[mask].sum())
+        self.assertIsNone(result.occupancy)
+        self.assertIsNone(result.duration_histogram)
+
+    @data((7, 'cartesian'), (100000, 'cartesian'), (7, 'spherical'), (100000, 'spherical'))
+    @unpack
+    def test_occupancy_is_the_weighted_histogram_of_the_points_inside(self, chunk_size, coordinates):
+        trajectory = orbit()
+        if coordinates == 'cartesian':
+            bins = 5
+            extent = [(-12, 12), (-12, 12), (-1, 1)]
+            points = trajectory._cartesian_km()
+        else:
+            bins = [np.linspace(0, 15, 4), np.linspace(-np.pi / 2, np.pi / 2, 5), np.linspace(0, 2 * np.pi, 9)]
+            extent = None
+            points = np.stack(trajectory._spherical_km(), axis=1)
+
+        result = broni.aggregate(trajectory, SHAPES, bins, extent, coordinates, chunk_size=chunk_size)
+        self.assertEqual(result.coordinates, broni.aggregation.COORDINATES[coordinates])
+
+        for name in SHAPES:
+            mask = broni._intersect_all(trajectory, broni._listify(SHAPES[name]))
+            expected = np.histogramdd(points[mask], result.bins, weights=steps(trajectory.time_index)[mask])[0]
+            np.testing.assert_allclose(result.occupancy[result.index(name)], expected)
+
+    def test_occupancy_in_another_coordinate_system(self):
+        trajectory = orbit()
+        edges = [np.linspace(-15, 15, 7)] * 3
+        result = broni.aggregate(trajectory, {'all': Sphere(0, 0, 0, 100)}, edges, coordinate_system='gsm',
+                                 chunk_size=1000)
+
+        expected = np.histogramdd(trajectory.to('gsm')._cartesian_km(), edges, weights=steps(trajectory.time_index))[0]
+        np.testing.assert_allclose(result.occupancy[0], expected)
+
+    def test_duration_histogram(self):
+        trajectory = orbit(numeric=True)
+        duration_bins = [0, 10, 20, 50, 1000]
+        result = broni.aggregate(trajectory, SHAPES, duration_bins=duration_bins, chunk_size=64)
+
+        for name in SHAPES:
+            durations = broni.interval_table(trajectory, SHAPES[name]).duration
+            np.testing.assert_array_equal(result.duration_histogram[result.index(name)],
+                                          np.histogram(durations, duration_bins)[0])
+            self.assertAlmostEqual(result.dwell_time[result.index(name)],
+                                   steps(trajectory.time_index)[broni._intersect_all(
+                                       trajectory, broni._listify(SHAPES[name]))].sum())
+
+    def test_time_range(self):
+        trajectory = orbit()
+        start, stop = trajectory.time_index[500], trajectory.time_index[2000]
+        result = broni.aggregate(trajectory, SHAPES, start=start, stop=stop, chunk_size=128)
+
+        view = trajectory[500:2001]
+        for name in SHAPES:
+            mask = broni._intersect_all(view, broni._listify(SHAPES[name]))
+            self.assertEqual(result.intervals[name].to_list(), broni.intervals(trajectory, SHAPES[name], start, stop))
+            self.assertAlmostEqual(result.dwell_time[result.index(name)], steps(view.time_index)[mask].sum())
+
+    def test_empty_region_set(self):
+        result = broni.aggregate(orbit(), {}, bins=2, extent=[(0, 1)] * 3, duration_bins=[0, 1])
+        self.assertEqual(result.occupancy.shape, (0, 2, 2, 2))
+        self.assertEqual(result.duration_histogram.shape, (0, 1))
+
+    def test_unknown_region(self):
+        with self.assertRaises(ValueError):
+            broni.aggregate(orbit(), SHAPES).index('unknown')
+
+    @data(dict(coordinates='polar'),
+          dict(chunk_size=0),
+          dict(bins=4),
+          dict(bins=[[0, 1], [0, 1]]),
+          dict(bins=[[0, 1], [0, 1], [1, 0]]),
+          dict(bins=[[0, 1], [0, 1], [0]]))
+    def test_invalid_arguments(self, kwargs):
+        with self.assertRaises(ValueError):
+            broni.aggregate(orbit(), SHAPES, **kwargs)
@@ -7,7 +7,8 @@ import numpy as np
 from astropy.units import km
 from astropy.units.quantity import Quantity
 
-from broni.shapes.callback import SphericalBoundary, Sheath
+from broni.shapes.callback import SphericalBoundary, Sheath, NestedBoundaries
+from broni.units import R_EARTH_KM
 import broni
 
 
@@ -92,6 +93,36 @@ class TestCallbacks(unittest.TestCase):
             ),
             np.array(expected))
 
+    @data(
+        lambda theta, phi, **kwargs: (1 * km, theta, phi),
+        lambda theta, phi, **kwargs: (np.float64(1 / R_EARTH_KM), theta, phi),
+        lambda theta, phi, **kwargs: (np.array(1 / R_EARTH_KM), theta, phi),
+        lambda theta, phi, **kwargs: (np.cos(0 * phi) / R_EARTH_KM, theta, phi),  # dimensionless Quantity
+    )
+    def test_boundary_with_constant_radius(self, callback):
+        td = np.array([[-1, 0, 0], [0, 0, 0], [1, 0, 0], [2, 0, 0]]) * km
+        trajectory = broni.Trajectory(td[:, 0], td[:, 1], td[:, 2], np.arange(0, 4), "gse")
+
+        for dtype in (np.float64, np.float32):
+            np.testing.assert_array_equal(
+                SphericalBoundary(callback, -0.5 * km, 0.5 * km).intersect(
+                    broni.Trajectory(td[:, 0], td[:, 1], td[:, 2], np.arange(0, 4), "gse", dtype=dtype)),
+                [True, False, True, False])
+
+        np.testing.assert_array_equal(Sheath(callback, SphereModel(1.5 * km)).intersect(trajectory),
+                                      [True, False, True, False])
+
+    def test_boundary_with_dimensionless_quantity_radius(self):
+        def model(lon, lat, **kwargs):
+            return 10 * (2 / (1 + np.cos(lat) * np.cos(lon))) ** 0.5, lon, lat
+
+        x = np.linspace(0, 20, 41) * R_EARTH_KM * km
+        trajectory = broni.Trajectory(x, np.zeros(41) * km, np.zeros(41) * km, np.arange(0, 41), "gse")
+
+        # 10 earth-radii at the sub-solar point
+        self.assertEqual(broni.intervals(trajectory, [SphericalBoundary(model, -0.25 * R_EARTH_KM * km,
+                                                                        0.25 * R_EARTH_KM * km)]), [(20, 20)])
+
     @data(
         ((1, 2, 0, 0), [[-1, 0, 0], [0, 0, 0], [1, 0, 0], [2, 0, 0]], [True, False, True, True]),
         ((1, 1.5, 0, 0), [[-1, 0, 0], [0, 0, 0], [1, 0, 0], [2, 0, 0]], [True, False, True, False]),
@@ -119,3 +150,59 @@ class TestCallbacks(unittest.TestCase):
                     "gse")
             ),
             np.array(expected))
+
+    def test_nested_boundaries_invalid_ctor_args_no_callbacks(self):
+        with self.assertRaises(ValueError):
+            assert NestedBoundaries()
+
+    def test_nested_boundaries_invalid_ctor_args_names_count(self):
+        with self.assertRaises(ValueError):
+            assert NestedBoundaries(SphereModel(1 * km), SphereModel(2 * km), names=('a', 'b'))
+
+    def test_nested_boundaries_invalid_ctor_args_unknown_region(self):
+        with self.assertRaises(ValueError):
+            assert NestedBoundaries(SphereModel(1 * km), names=('a', 'b'), region='c')
+
+    def test_nested_boundaries_intersect_without_region(self):
+        td = np.array([[0, 0, 0]]) * km
+        with self.assertRaises(ValueError):
+            NestedBoundaries(SphereModel(1 * km)).intersect(
+                broni.Trajectory(td[:, 0], td[:, 1], td[:, 2], [0], "gse"))
+
+    @data(
+        ((1, 1.5), [[-1, 0, 0], [0, 0, 0], [1.2, 0, 0], [2, 0, 0]], [0, 0, 1, 2]),
+        ((1, 1.5, 1.8), [[-1, 0, 0], [0, 0, 0], [1.2, 0, 0], [0, 1.6, 0], [0, 0, 2]], [0, 0, 1, 2, 3]),
+        ((1,), [[-1, 0, 0], [0, 0, 0], [1.2, 0, 0]], [0, 0, 1]),
+    )
+    @unpack
+    def test_nested_boundaries_labels(self, radii, trajectory, expected):
+        shape = NestedBoundaries(*[SphereModel(r * km) for r in radii])
+
+        td = np.array(trajectory) * km
+
+        np.testing.assert_array_equal(
+            shape.label(
+                broni.Trajectory(
+                    td[:, 0], td[:, 1], td[:, 2],
+                    np.arange(0, len(trajectory)),
+                    "gse")
+            ),
+            np.array(expected))
+
+    @data(
+        ('magnetosphere', [True, True, False, False]),
+        ('magnetosheath', [False, False, True, False]),
+        ('solar wind', [False, False, False, True]),
+        (1, [False, False, True, False]),
+    )
+    @unpack
+    def test_nested_boundaries_region_intersections(self, region, expected):
+        shape = NestedBoundaries(SphereModel(1 * km), SphereModel(1.5 * km),
+                                 names=('magnetosphere', 'magnetosheath', 'solar wind'),
+                                 region=region)
+
+        td = np.array([[-1, 0, 0], [0, 0, 0], [1.2, 0, 0], [2, 0, 0]]) * km
+
+        np.testing.assert_array_equal(
+            shape.intersect(broni.Trajectory(td[:, 0], td[:, 1], td[:, 2], np.arange(0, 4), "gse")),
+            np.array(expected))
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+import unittest
+
+import numpy as np
+from astropy.units import km
+
+import broni
+from broni.shapes.callback import SphericalBoundary
+from broni.shapes.collection import ShapeCollection
+from broni.shapes.primitives import Cuboid, Sphere
+
+
+class TestShapeCollection(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(42)
+
+        t = np.linspace(0, 20 * np.pi, 5000)
+        td = np.stack((np.cos(t) * 100, np.sin(t) * 100, t), axis=1) * km
+        self.trajectory = broni.Trajectory(td[:, 0], td[:, 1], td[:, 2], np.arange(len(t)), 'gse')
+
+        self.shapes = []
+        for _ in range(200):
+            x, y, z = rng.uniform(-100, 100), rng.uniform(-100, 100), rng.uniform(0, 63)
+            size = rng.uniform(1, 15)
+            if rng.uniform() < 0.5:
+                self.shapes.append(Sphere(x * km, y * km, z * km, size * km))
+            else:
+                self.shapes.append(Cuboid(x * km, y * km, z * km, (x + size) * km, (y - size) * km, (z + size) * km))
+
+    def test_unsupported_shape(self):
+        with self.assertRaises(TypeError):
+            assert ShapeCollection([SphericalBoundary(lambda *args, **kwargs: (0,), 0)])
+
+    def test_mixed_coordinate_systems(self):
+        for frames in (('gsm', 'gse'), ('gsm', None)):
+            with self.assertRaises(ValueError):
+                assert ShapeCollection([Sphere(0 * km, 0 * km, 0 * km, 1 * km, frame) for frame in frames])
+
+        self.assertEqual(ShapeCollection([Sphere(0 * km, 0 * km, 0 * km, 1 * km, frame)
+                                          for frame in ('GSM', 'gsm')]).coordinate_system, 'gsm')
+        self.assertIsNone(ShapeCollection(self.shapes).coordinate_system)
+
+    def test_empty_collection(self):
+        collection = ShapeCollection([])
+        self.assertEqual(collection.intervals(self.trajectory), {})
+        self.assertFalse(collection.intersect(self.trajectory).any())
+
+    def test_intervals_per_shape_match_individual_shapes(self):
+        expected = {}
+        for i, shape in enumerate(self.shapes):
+            found = broni.intervals(self.trajectory, shape)
+            if found:
+                expected[i] = found
+
+        self.assertTrue(len(expected) > 0)
+        for cell_size in (None, 3 * km, 50 * km):
+            self.assertEqual(ShapeCollection(self.shapes, cell_size).intervals(self.trajectory), expected)
+
+    def test_intersect_is_union(self):
+        expected = np.logical_or.reduce([shape.intersect(self.trajectory) for shape in self.shapes])
+        np.testing.assert_array_equal(ShapeCollection(self.shapes).intersect(self.trajectory), expected)
+
+    def test_interval_table_shape_column(self):
+        table = ShapeCollection(self.shapes).interval_table(self.trajectory)
+        shapes = table.statistics['shape']
+
+        self.assertEqual(len(shapes), len(table))
+        self.assertTrue(np.all(np.diff(shapes) >= 0))
+
+    def test_interval_table_statistic(self):
+        x = np.arange(10)
+        trajectory = broni.Trajectory(x * km, np.zeros(10) * km, np.zeros(10) * km, np.arange(10), 'gse')
+
+        # the first shape's interval ends at the last point
+        table = ShapeCollection([Sphere(8.5 * km, 0 * km, 0 * km, 2 * km), Sphere(1 * km, 0 * km, 0 * km, 1 * km)]) \
+            .interval_table(trajectory).add_statistic('x', x, 'max')
+        np.testing.assert_array_equal(table.stop_index, [9, 2])
+        np.testing.assert_array_equal(table.statistics['x'], [9, 2])
+
+    def test_large_shapes_are_not_in_the_grid(self):
+        # one shape spanning ~1e5 cells per axis would otherwise be registered in ~1e15 grid-cells
+        shapes = self.shapes + [Sphere(0 * km, 0 * km, 30 * km, 1e6 * km), Cuboid(*(-1e6, -1e6, 10, 1e6, 1e6, 20) * km)]
+        expected = {i: broni.intervals(self.trajectory, shape) for i, shape in enumerate(shapes)}
+        expected = {i: found for i, found in expected.items() if found}
+
+        collection = ShapeCollection(shapes, 10 * km)
+        np.testing.assert_array_equal(collection._large, [200, 201])
+        self.assertEqual(collection.intervals(self.trajectory), expected)
+
+        # all shapes out of the grid
+        only_large = ShapeCollection(shapes[200:], 10 * km)
+        self.assertEqual(len(only_large._cell_keys), 0)
+        self.assertEqual(only_large.intervals(self.trajectory),
+                         {i - 200: found for i, found in expected.items() if i >= 200})
+        expected = np.logical_or.reduce([shape.intersect(self.trajectory) for shape in shapes[200:]])
+        np.testing.assert_array_equal(only_large.intersect(self.trajectory), expected)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+import unittest
+from ddt import ddt, data, unpack
+
+import numpy as np
+from astropy.units import km
+
+import broni
+from broni import frames
+from broni.shapes.primitives import Sphere
+
+TIME = np.datetime64('2020-06-21T00:00', 'ns') + np.arange(0, 2 * 86400, 60) * np.timedelta64(1, 's')
+
+
+@ddt
+class TestFrames(unittest.TestCase):
+    def test_unsupported_frame(self):
+        with self.assertRaises(ValueError):
+            frames.rotation_matrices(TIME[:1], 'gse', 'rtn')
+
+    @data(*[(source, target) for source in frames.FRAMES for target in frames.FRAMES])
+    @unpack
+    def test_rotations_are_orthonormal_and_invertible(self, source, target):
+        m = frames.rotation_matrices(TIME[::60], source, target)
+        back = frames.rotation_matrices(TIME[::60], target, source)
+
+        np.testing.assert_allclose(m @ np.swapaxes(m, 1, 2), np.broadcast_to(np.eye(3), m.shape), atol=1e-12)
+        np.testing.assert_allclose(back @ m, np.broadcast_to(np.eye(3), m.shape), atol=1e-12)
+
+    @data(
+        ('gse', 'gsm', 0),  # rotation around the sun-earth line
+        ('gei', 'geo', 2),  # rotation around the rotation axis
+    )
+    @unpack
+    def test_rotation_axis_is_kept(self, source, target, axis):
+        m = frames.rotation_matrices(TIME, source, target)
+        np.testing.assert_allclose(m[:, axis, axis], 1, atol=1e-12)
+
+    def test_dipole_is_sm_z_axis(self):
+        np.testing.assert_allclose(frames.rotation_matrices(TIME, 'geo', 'sm') @ frames._DIPOLE_GEO,
+                                   np.broadcast_to((0, 0, 1), (len(TIME), 3)), atol=1e-12)
+
+    def test_dipole_tilt_at_solstice(self):
+        tilt = np.degrees(np.arcsin((frames.rotation_matrices(TIME, 'geo', 'gsm') @ frames._DIPOLE_GEO)[:, 0]))
+        self.assertTrue(20 < tilt.max() < 35)
+        self.assertTrue(-5 < tilt.min() < 15)
+
+    def test_transform_interpolation(self):
+        xyz = np.random.default_rng(0).uniform(-1e5, 1e5, (len(TIME), 3))
+        expected = np.einsum('nij,nj->ni', frames.rotation_matrices(TIME, 'geo', 'gse'), xyz)
+
+        np.testing.assert_allclose(frames.transform(xyz, TIME, 'geo', 'gse', np.timedelta64(2, 'm')),
+                                   expected, atol=5)
+        np.testing.assert_allclose(frames.transform(xyz, TIME, 'geo', 'gse', chunk_size=1000), expected, atol=1e-6)
+
+    def test_transform_of_unsorted_times(self):
+        xyz = np.random.default_rng(0).uniform(-1e5, 1e5, (len(TIME), 3))
+        for order in (np.arange(len(TIME))[::-1], np.random.default_rng(1).permutation(len(TIME))):
+            expected = np.einsum('nij,nj->ni', frames.rotation_matrices(TIME[order], 'geo', 'gse'), xyz)
+            np.testing.assert_allclose(frames.transform(xyz, TIME[order], 'geo', 'gse', np.timedelta64(2, 'm')),
+                                       expected, atol=5)
+
+        swapped = TIME.copy()
+        swapped[[0, 1000]] = swapped[[1000, 0]]
+        expected = np.einsum('nij,nj->ni', frames.rotation_matrices(swapped, 'geo', 'gse'), xyz)
+        np.testing.assert_allclose(frames.transform(xyz, swapped, 'geo', 'gse', np.timedelta64(2, 'm')),
+                                   expected, atol=5)
+
+
+class TestTrajectoryFrames(unittest.TestCase):
+    def setUp(self):
+        xyz = np.random.default_rng(0).uniform(-1e5, 1e5, (len(TIME), 3)) * km
+        self.trajectory = broni.Trajectory(xyz[:, 0], xyz[:, 1], xyz[:, 2], TIME, 'gse')
+
+    def test_transformation_is_cached(self):
+        gsm = self.trajectory.to('GSM')
+
+        self.assertEqual(gsm.coordinate_system, 'gsm')
+        self.assertIs(self.trajectory.to('gsm'), gsm)
+        self.assertIs(gsm.to('gse'), self.trajectory)
+        self.assertIs(self.trajectory.to('gse'), self.trajectory)
+
+    def test_view_uses_transformation_of_parent(self):
+        gsm = self.trajectory.to('gsm')
+        view = self.trajectory[10:20].to('gsm')
+
+        self.assertTrue(np.shares_memory(view.x, gsm.x))
+        np.testing.assert_array_equal(view.cartesian, gsm.cartesian[10:20])
+
+    def test_unsorted_time_index(self):
+        order = np.arange(len(TIME))[::-1]
+        xyz = self.trajectory._cartesian_km()[order]
+        reversed_trajectory = broni.Trajectory(xyz[:, 0], xyz[:, 1], xyz[:, 2], TIME[order], 'gse')
+
+        np.testing.assert_allclose(reversed_trajectory.to('gsm')._cartesian_km(),
+                                   self.trajectory.to('gsm')._cartesian_km()[order], atol=1e-6)
+
+    def test_transformation_requires_datetimes(self):
+        with self.assertRaises(ValueError):
+            broni.Trajectory([0] * km, [0] * km, [0] * km, [0], 'gse').to('gsm')
+
+    def test_shape_in_other_frame(self):
+        gsm = self.trajectory.to('gsm')
+        x, y, z = gsm.cartesian[100]
+        shape = Sphere(x, y, z, 1000 * km, coordinate_system='gsm')
+
+        expected = Sphere(x, y, z, 1000 * km).intersect(gsm)
+        self.assertTrue(expected[100])
+        np.testing.assert_array_equal(shape.intersect(self.trajectory), expected)
+        self.assertEqual(broni.intervals(self.trajectory, shape), broni.intervals(gsm, shape))
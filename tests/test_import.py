@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+import subprocess
+import sys
+import unittest
+
+IMPORT_CORE = "import broni, broni.shapes.primitives, broni.shapes.collection, broni.shapes.mesh"
+
+
+def run(code):
+    return subprocess.run([sys.executable, '-c', code], check=True, stdout=subprocess.PIPE,
+                          universal_newlines=True).stdout
+
+
+class TestImport(unittest.TestCase):
+    def test_core_does_not_import_astropy(self):
+        output = run(f"""
+import sys
+{IMPORT_CORE}
+import numpy as np
+from broni.shapes.primitives import Cuboid, Sphere
+
+x = np.arange(10.)
+trajectory = broni.Trajectory(x, x, x, np.arange(10), 'gse')
+print([(int(start), int(stop)) for start, stop in broni.intervals(trajectory, [Cuboid(0, 0, 0, 5, 5, 5),
+                                                                              Sphere(3, 3, 3, 2)])])
+print(sorted(m for m in sys.modules if m.split('.')[0] == 'astropy'))
+""")
+        self.assertEqual(output.splitlines(), ['[(2, 4)]', '[]'])
+
+    def test_astropy_is_loaded_on_first_use_of_units(self):
+        output = run(f"""
+import sys
+{IMPORT_CORE}
+from broni.shapes.primitives import Sphere
+
+print(Sphere(0, 0, 0, 1).radius, 'astropy.units' in sys.modules)
+""")
+        self.assertEqual(output.strip(), '1.0 km True')
+
+    def test_import_time(self):
+        output = run(f"""
+import time
+import numpy
+start = time.perf_counter()
+{IMPORT_CORE}
+core = time.perf_counter() - start
+
+start = time.perf_counter()
+import astropy.units
+print(core, time.perf_counter() - start)
+""")
+        # relative to the import of astropy.units to not depend on the speed of the machine
+        core, astropy_units = map(float, output.split())
+        self.assertLess(core, astropy_units)
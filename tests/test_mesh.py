@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+import unittest
+from ddt import ddt, data
+
+import numpy as np
+from astropy.units import km
+
+import broni
+from broni.shapes.mesh import MeshShape
+from broni.shapes.primitives import Cuboid, Sphere
+
+
+def cube_mesh(size):
+    vertices = np.array([[x, y, z] for x in (0, size) for y in (0, size) for z in (0, size)], dtype=float)
+    faces = []
+    for a, b, c, d in [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]:
+        faces += [(a, b, c), (a, c, d)]
+    return vertices * km, np.array(faces)
+
+
+def sphere_mesh(n_lat, n_lon, radius):
+    lat = np.linspace(-np.pi / 2, np.pi / 2, n_lat + 1)[1:-1]
+    lon = np.linspace(0, 2 * np.pi, n_lon, endpoint=False)
+    lat, lon = np.meshgrid(lat, lon, indexing='ij')
+    vertices = np.stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)), axis=-1).reshape(-1, 3)
+    vertices = np.vstack((vertices, [[0, 0, -1], [0, 0, 1]])) * radius
+    south, north = len(vertices) - 2, len(vertices) - 1
+
+    def index(i, j):
+        return i * n_lon + j % n_lon
+
+    faces = []
+    for j in range(n_lon):
+        for i in range(n_lat - 2):
+            faces += [(index(i, j), index(i, j + 1), index(i + 1, j + 1)),
+                      (index(i, j), index(i + 1, j + 1), index(i + 1, j))]
+        faces += [(south, index(0, j + 1), index(0, j)), (north, index(n_lat - 2, j), index(n_lat - 2, j + 1))]
+    return vertices * km, np.array(faces)
+
+
+def trajectory(points):
+    td = points * km
+    return broni.Trajectory(td[:, 0], td[:, 1], td[:, 2], np.arange(len(points)), 'gse')
+
+
+@ddt
+class TestMeshShape(unittest.TestCase):
+    def test_invalid_ctor_args_shape_of_vertices(self):
+        with self.assertRaises(ValueError):
+            assert MeshShape(np.zeros((3, 2)) * km, [[0, 1, 2]])
+
+    def test_invalid_ctor_args_no_faces(self):
+        with self.assertRaises(ValueError):
+            assert MeshShape(np.zeros((3, 3)) * km, np.zeros((0, 3)))
+
+    @data(1, 2, 7, 64)
+    def test_cube_mesh_equals_cuboid(self, resolution):
+        points = np.random.default_rng(1).uniform(-1, 3, (5000, 3))
+        points[:10] = [[1, 1, 1], [0.5, 0.5, 0.5], [1, 1, 3], [1, 1, -1], [1, 1, 0.5],
+                       [0.5, 1, 1], [1, 0.5, 1.5], [1.5, 1.5, 1.5], [0.5, 1.5, 2.5], [1.5, 0.5, -0.5]]
+
+        np.testing.assert_array_equal(
+            MeshShape(*cube_mesh(2), resolution=resolution).intersect(trajectory(points)),
+            Cuboid(*(0, 0, 0, 2, 2, 2) * km).intersect(trajectory(points)))
+
+    def test_sphere_mesh_away_from_the_surface(self):
+        points = np.random.default_rng(2).uniform(-12, 12, (20000, 3))
+        distance = np.linalg.norm(points, axis=1)
+        away = np.abs(distance - 10) > 0.05  # the mesh is a polyhedron inside the sphere
+
+        result = MeshShape(*sphere_mesh(40, 40, 10), resolution=16, chunk_size=1000).intersect(trajectory(points))
+        expected = Sphere(*(0, 0, 0, 10) * km).intersect(trajectory(points))
+        np.testing.assert_array_equal(result[away], expected[away])
+
+    def test_intervals_and_logical_and(self):
+        points = np.array([[-1, 1, 1], [0.5, 0.5, 0.5], [1.5, 1.5, 1.5], [3, 1, 1], [1.5, 1.5, 1.5]], dtype=float)
+
+        self.assertEqual(broni.intervals(trajectory(points), MeshShape(*cube_mesh(2))), [(1, 2), (4, 4)])
+        self.assertEqual(broni.intervals(trajectory(points), [MeshShape(*cube_mesh(2)),
+                                                              Sphere(*(2, 2, 2, 1) * km)]), [(2, 2), (4, 4)])
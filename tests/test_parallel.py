@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+import unittest
+from ddt import ddt, data, unpack
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+
+import broni
+import broni.parallel
+from broni.shapes.callback import Sheath
+from broni.shapes.models import shue97, conic_bow_shock
+from broni.shapes.primitives import Cuboid, Sphere
+
+R_EARTH = 6378.1
+
+
+def orbit(n=5000, dtype=np.float64):
+    phase = np.linspace(0, 12 * np.pi, n)
+    radius = 12 * R_EARTH + 4 * R_EARTH * np.cos(phase / 3)
+    time = np.datetime64('2020-01-01') + np.arange(n) * np.timedelta64(1, 'm')
+    return broni.Trajectory(radius * np.cos(phase), radius * np.sin(phase), np.zeros(n), time, 'gse', dtype=dtype)
+
+
+SHAPES = [Sheath(shue97, conic_bow_shock), Cuboid(0, -20 * R_EARTH, -R_EARTH, 20 * R_EARTH, 20 * R_EARTH, R_EARTH)]
+
+
+@ddt
+class TestParallel(unittest.TestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(4)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_partitions(self):
+        self.assertEqual(broni.parallel.partitions(0, 10, 4), [(0, 4), (4, 8), (8, 10)])
+        self.assertEqual(broni.parallel.partitions(3, 3, 4), [])
+
+    def test_invalid_partition_size(self):
+        with self.assertRaises(ValueError):
+            broni.parallel.intervals(orbit(), SHAPES, partition_size=0, executor=self.executor)
+
+    @data(1, 7, 100, 1000, 10000)
+    def test_same_as_serial(self, partition_size):
+        trajectory = orbit()
+        expected = broni.interval_table(trajectory, SHAPES)
+        found = broni.parallel.interval_table(trajectory, SHAPES, partition_size=partition_size,
+                                              executor=self.executor)
+
+        self.assertGreater(len(expected), 2)
+        np.testing.assert_array_equal(found.start_index, expected.start_index)
+        np.testing.assert_array_equal(found.stop_index, expected.stop_index)
+
+    @data(('2020-01-01T10:00', '2020-01-02T20:00'), (None, '2020-01-02'), ('2020-01-02T05:00', None))
+    @unpack
+    def test_time_range(self, start, stop):
+        trajectory = orbit()
+        self.assertEqual(broni.parallel.intervals(trajectory, SHAPES[0], start, stop, 333, self.executor),
+                         broni.intervals(trajectory, SHAPES[0], start, stop))
+
+    def test_time_range_converts_the_window_only(self):
+        trajectory = orbit()
+        first, last = trajectory.index_range('2020-01-02T05:00', '2020-01-02T20:00')
+        expected = broni.intervals(trajectory[first:last], SHAPES[1])
+        self.assertIsNone(trajectory._cartesian)
+
+        found = broni.parallel.intervals(trajectory, SHAPES[1], '2020-01-02T05:00', '2020-01-02T20:00', 100,
+                                         self.executor)
+        self.assertEqual(found, expected)
+        self.assertIsNone(trajectory._cartesian)
+
+    def test_single_precision(self):
+        trajectory = orbit(dtype=np.float32)
+        self.assertEqual(broni.parallel.intervals(trajectory, SHAPES, partition_size=500, executor=self.executor),
+                         broni.intervals(trajectory, SHAPES))
+
+    def test_no_shapes(self):
+        self.assertEqual(broni.parallel.intervals(orbit(), [], executor=self.executor), [])
+
+    def test_concurrent_calls_on_threads(self):
+        # calls with different shapes overlapping on the threads of one process replace each other's shapes
+        trajectories = [orbit(1000 + 100 * i) for i in range(8)]
+        with ThreadPoolExecutor(4) as callers:
+            futures = [callers.submit(broni.parallel.interval_table, trajectory, SHAPES[i % 2:], None, None, 100,
+                                      self.executor)
+                       for i, trajectory in enumerate(trajectories)]
+            results = [future.result() for future in futures]
+
+        for i, (trajectory, result) in enumerate(zip(trajectories, results)):
+            expected = broni.interval_table(trajectory, SHAPES[i % 2:])
+            np.testing.assert_array_equal(result.start_index, expected.start_index)
+            np.testing.assert_array_equal(result.stop_index, expected.stop_index)
+
+    def test_process_pool(self):
+        trajectory = orbit()
+        shapes = SHAPES + [Sphere(12 * R_EARTH, 0, 0, 8 * R_EARTH)]
+        self.assertEqual(broni.parallel.intervals(trajectory, shapes, partition_size=1000, workers=2),
+                         broni.intervals(trajectory, shapes))
+
+    def test_process_pool_without_initializer(self):
+        # before Python 3.7 the shapes are sent with each partition
+        trajectory = orbit()
+        with mock.patch('broni.parallel._POOL_INITIALIZER', False):
+            self.assertEqual(broni.parallel.intervals(trajectory, SHAPES, partition_size=1000, workers=2),
+                             broni.intervals(trajectory, SHAPES))
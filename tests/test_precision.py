@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+import tracemalloc
+import unittest
+from ddt import ddt, data
+
+import numpy as np
+from astropy.units import km
+
+import broni
+from broni.shapes.callback import SphericalBoundary, Sheath, NestedBoundaries
+from broni.shapes.models import shue97, conic_bow_shock
+from broni.shapes.primitives import Cuboid, Sphere
+from broni.units import R_EARTH_KM
+
+
+class SphereModel:
+    def __init__(self, radius):
+        self.r = radius
+
+    def __call__(self, theta, phi, **kwargs):
+        return np.full(theta.shape, self.r) * km, theta, phi
+
+
+def points():
+    # points concentrated around the boundaries of the shapes below
+    rng = np.random.default_rng(0)
+    directions = rng.normal(size=(20000, 3))
+    directions /= np.linalg.norm(directions, axis=1)[:, np.newaxis]
+    around_sphere = directions * (50000 + rng.normal(0, 1e-2, (20000, 1)))
+    around_cuboid = rng.uniform(20000, 30000, (20000, 3))
+    around_cuboid[np.arange(20000), rng.integers(0, 3, 20000)] = 25000 + rng.normal(0, 1e-2, 20000)
+    return np.concatenate((around_sphere, around_cuboid))
+
+
+def model_points(model, count=100000):
+    # points around a boundary model, mostly on the flanks and in the tail where its gradient is steep
+    rng = np.random.default_rng(1)
+    lon, lat = rng.uniform(0, 2 * np.pi, count), np.arcsin(rng.uniform(-1, 1, count))
+    lon[::2] = rng.uniform(0.6, 0.9, count // 2) * np.pi
+    r = model(lon, lat)[0] * R_EARTH_KM + rng.normal(0, 1, count)
+    return np.stack((r * np.cos(lat) * np.cos(lon), r * np.cos(lat) * np.sin(lon), r * np.sin(lat)), axis=1)
+
+
+SHAPES = [
+    Sphere(*(0, 0, 0, 50000) * km),
+    Cuboid(*(10000, 10000, 10000, 25000, 25000, 25000) * km),
+    SphericalBoundary(SphereModel(50000), -1e-3 * km, 1e-3 * km),
+    Sheath(SphereModel(49999.99), SphereModel(50000.01)),
+    NestedBoundaries(SphereModel(49999.99), SphereModel(50000), region=1),
+]
+
+
+@ddt
+class TestPrecision(unittest.TestCase):
+    def setUp(self):
+        xyz = points()
+        rounded = xyz.astype(np.float32).astype(np.float64) * km
+        time = np.arange(len(xyz))
+
+        self.double = broni.Trajectory(rounded[:, 0], rounded[:, 1], rounded[:, 2], time, 'gse')
+        self.single = broni.Trajectory(xyz[:, 0] * km, xyz[:, 1] * km, xyz[:, 2] * km, time, 'gse', dtype=np.float32)
+        self.conservative = broni.Trajectory(xyz[:, 0] * km, xyz[:, 1] * km, xyz[:, 2] * km, time, 'gse',
+                                             dtype=np.float32, guard='conservative')
+
+    def test_invalid_ctor_args(self):
+        with self.assertRaises(ValueError):
+            assert broni.Trajectory([0], [0], [0], [0], 'gse', dtype=np.float16)
+        with self.assertRaises(ValueError):
+            assert broni.Trajectory([0], [0], [0], [0], 'gse', guard='none')
+
+    def test_storage_is_single_precision(self):
+        self.assertEqual(self.single._cartesian.dtype, np.float32)
+        self.assertEqual(self.single._cartesian.nbytes * 2, self.double._cartesian_km().nbytes)
+        self.assertTrue(np.shares_memory(self.single.x, self.single._cartesian))
+        self.assertEqual(self.single.r.dtype, np.float32)
+        self.assertEqual(self.single[10:20].dtype, np.float32)
+
+    @data(*SHAPES)
+    def test_exact_guard_gives_double_precision_results(self, shape):
+        np.testing.assert_array_equal(shape.intersect(self.single), shape.intersect(self.double))
+
+    @data(*SHAPES)
+    def test_conservative_guard_gives_superset(self, shape):
+        expected = shape.intersect(self.double)
+        result = shape.intersect(self.conservative)
+
+        self.assertTrue(np.all(result[expected]))
+
+    def test_nested_boundaries_labels(self):
+        shape = NestedBoundaries(SphereModel(49999.99), SphereModel(50000))
+        np.testing.assert_array_equal(shape.label(self.single), shape.label(self.double))
+        np.testing.assert_array_equal(shape.label(self.conservative), shape.label(self.double))
+
+    def test_frame_aware_shapes(self):
+        xyz = points()[::10]
+        time = np.datetime64('2020-03-01') + np.arange(len(xyz)) * np.timedelta64(10, 's')
+        single = broni.Trajectory(*xyz.T, time, 'gse', dtype=np.float32)
+
+        transformed = single.to('gsm')
+        self.assertEqual(transformed.dtype, np.float32)
+        self.assertEqual(transformed._cartesian_km().dtype, np.float32)
+        self.assertTrue(all(np.shares_memory(column, transformed._cartesian)
+                            for column in (transformed.x, transformed.y, transformed.z)))
+        expected = broni.Trajectory(*xyz.T, time, 'gse').to('gsm')._cartesian_km()
+        np.testing.assert_allclose(transformed._cartesian_km(), expected, rtol=0, atol=1e-2)
+
+        # same results as in double precision for the rounded, transformed positions
+        double = broni.Trajectory(*transformed._cartesian_km().astype(np.float64).T, time, 'gsm')
+        for shape in (Sphere(*(0, 0, 0, 50000) * km, 'gsm'),
+                      SphericalBoundary(SphereModel(50000), -1e-3 * km, 1e-3 * km, 'gsm')):
+            result = shape.intersect(single)
+            self.assertTrue(result.any())
+            np.testing.assert_array_equal(result, shape.intersect(double))
+
+    @data(shue97, conic_bow_shock)
+    def test_boundary_models(self, model):
+        xyz = model_points(model)
+        rounded = xyz.astype(np.float32).astype(np.float64)
+        time = np.arange(len(xyz))
+
+        double = broni.Trajectory(*rounded.T, time, 'gse')
+        single = broni.Trajectory(*xyz.T, time, 'gse', dtype=np.float32)
+        conservative = broni.Trajectory(*xyz.T, time, 'gse', dtype=np.float32, guard='conservative')
+
+        for shape in (SphericalBoundary(model, None, 0 * km), Sheath(shue97, conic_bow_shock),
+                      NestedBoundaries(model, lambda lon, lat, **kwargs: (30, lon, lat), region=1)):
+            expected = shape.intersect(double)
+            self.assertTrue(0 < np.count_nonzero(expected) < len(expected))
+            np.testing.assert_array_equal(shape.intersect(single), expected)
+            self.assertTrue(np.all(shape.intersect(conservative)[expected]))
+
+    @data(SphericalBoundary(shue97, -1000 * km, 1000 * km), Sheath(shue97, conic_bow_shock))
+    def test_callback_boundaries_allocate_less_than_double_precision(self, shape):
+        # the callbacks are evaluated on the stored single precision angles, only the few points close to the
+        # boundaries (of an orbit crossing them) are re-evaluated in double precision
+        phase = np.linspace(0, 40 * np.pi, 400000)
+        radius = (12 + 8 * np.cos(phase / 7)) * R_EARTH_KM
+        xyz = np.stack((radius * np.cos(phase), radius * np.sin(phase), np.full(len(phase), R_EARTH_KM)), axis=1)
+        xyz = xyz.astype(np.float32).astype(np.float64)
+        time = np.arange(len(xyz))
+
+        allocated, results = {}, {}
+        for dtype in (np.float64, np.float32):
+            trajectory = broni.Trajectory(*xyz.T, time, 'gse', dtype=dtype)
+            trajectory._spherical_km()
+
+            tracemalloc.start()
+            try:
+                results[dtype] = shape.intersect(trajectory)
+                allocated[dtype] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        self.assertTrue(0 < np.count_nonzero(results[np.float64]) < len(xyz))
+        np.testing.assert_array_equal(results[np.float32], results[np.float64])
+        self.assertLess(allocated[np.float32], allocated[np.float64])
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+import unittest
+from unittest import mock
+
+import numpy as np
+from astropy.units import km
+
+import broni
+from broni import profiling
+from broni.shapes.callback import Sheath
+from broni.shapes.primitives import Cuboid
+
+
+class SphereModel:
+    def __init__(self, radius):
+        self.r = radius
+
+    def __call__(self, theta, phi, **kwargs):
+        return np.full(theta.shape, self.r), theta, phi
+
+
+def trajectory():
+    td = np.array([[-1, -1, -1], [0, 0, 0], [1, 1, 1], [3, 3, 3], [1, 1, 1], [0, 0, 0]]) * km
+    return broni.Trajectory(td[:, 0], td[:, 1], td[:, 2], np.arange(6), 'gse')
+
+
+class TestProfiling(unittest.TestCase):
+    def test_disabled_by_default(self):
+        self.assertIsNone(profiling.stage('test').__enter__())
+
+    def test_report_of_stages_and_shapes(self):
+        shapes = [Cuboid(*(0, 0, 0, 2, 2, 2) * km), Sheath(SphereModel(1e-4), SphereModel(3e-4))]
+
+        with profiling.profile() as report:
+            broni.intervals(trajectory(), shapes)
+
+        summary = {(entry['name'], entry['shape']): entry for entry in report.summary()}
+        self.assertEqual(summary[('intersect', 'Cuboid')]['samples'], 6)
+        self.assertEqual(summary[('intersect', 'Cuboid')]['surviving'], 4)
+        self.assertEqual(summary[('intersect', 'Sheath')]['count'], 1)
+        self.assertEqual(summary[('callback', 'SphereModel')]['count'], 2)
+        self.assertEqual(summary[('intervals', None)]['surviving'], 2)
+        self.assertIn(('spherical', None), summary)
+        self.assertIn(('cartesian', None), summary)
+
+        for record in report.records:
+            self.assertGreaterEqual(record.wall_time, 0)
+            self.assertGreaterEqual(record.allocated, 0)
+
+        self.assertIn('intersect', str(report))
+
+    def test_report_per_shape_instance(self):
+        shapes = [Cuboid(*(-2, -2, -2, 2, 2, 2) * km), Cuboid(*(0, 0, 0, 2, 2, 2) * km),
+                  Sheath(SphereModel(1e-4), SphereModel(3e-4))]
+
+        with profiling.profile(memory=False) as report:
+            broni.intervals(trajectory(), shapes)
+            broni.regions(trajectory(), {'inner': shapes[1], 'outer': shapes[2]})
+
+        summary = {(entry['name'], entry['shape_id']): entry for entry in report.summary()}
+        self.assertEqual(summary[('intersect', '#0')]['surviving'], 5)
+        self.assertEqual(summary[('intersect', '#1')]['surviving'], 4)
+        self.assertEqual(summary[('intersect', '#1')]['shape'], 'Cuboid')
+        self.assertEqual(summary[('callback', '#2')]['count'], 2)
+        self.assertEqual(summary[('intersect', 'inner#0')]['samples'], 6)
+        self.assertEqual(summary[('callback', 'outer#0')]['count'], 2)
+        self.assertIn('Cuboid #1', str(report))
+
+    def test_without_memory_tracing(self):
+        with profiling.profile(memory=False) as report:
+            broni.intervals(trajectory(), Cuboid(*(0, 0, 0, 2, 2, 2) * km))
+
+        self.assertTrue(len(report.records) > 0)
+        self.assertTrue(all(record.allocated is None for record in report.records))
+
+    def test_nested_stages_propagate_allocations(self):
+        with profiling.profile() as report:
+            with profiling.stage('outer'):
+                with profiling.stage('inner'):
+                    data = np.ones(1 << 20)
+                del data
+
+        inner, outer = report.records
+        self.assertEqual((inner.name, inner.depth, outer.name, outer.depth), ('inner', 1, 'outer', 0))
+        self.assertGreaterEqual(inner.allocated, 8 << 20)
+        self.assertGreaterEqual(outer.allocated, inner.allocated)
+
+    def test_allocations_without_reset_peak(self):
+        # Python < 3.9: the peak cannot be reset, peaks reached before a stage must not be attributed to it
+        with mock.patch.object(profiling, '_reset_peak', None):
+            with profiling.profile() as report:
+                data = np.ones(4 << 20)
+                del data
+                with profiling.stage('outer'):
+                    with profiling.stage('inner'):
+                        data = np.ones(1 << 20)
+                    del data
+                with profiling.stage('small'):
+                    data = np.ones(16)
+                del data
+
+        inner, outer, small = report.records
+        self.assertGreaterEqual(inner.allocated, 8 << 20)
+        self.assertLess(inner.allocated, 32 << 20)
+        self.assertGreaterEqual(outer.allocated, inner.allocated)
+        self.assertLess(small.allocated, 1 << 20)
+
+    def test_hooks(self):
+        events = []
+
+        def hook(event, record):
+            events.append((event, record.name))
+
+        profiling.add_hook(hook)
+        try:
+            broni.intervals(trajectory(), Cuboid(*(0, 0, 0, 2, 2, 2) * km))
+        finally:
+            profiling.remove_hook(hook)
+
+        self.assertIn(('enter', 'intersect'), events)
+        self.assertIn(('exit', 'intervals'), events)
+        self.assertIsNone(profiling.stage('test').__enter__())
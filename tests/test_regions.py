@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+import unittest
+from ddt import ddt, data, unpack
+
+import numpy as np
+from astropy.units import km
+
+import broni
+from broni.shapes.primitives import Cuboid, Sphere
+
+
+@ddt
+class TestRegions(unittest.TestCase):
+    def test_too_many_regions(self):
+        with self.assertRaises(ValueError):
+            assert broni.regions(broni.Trajectory([] * km, [] * km, [] * km, [], 'gse'),
+                                 {str(i): [] for i in range(65)})
+
+    def test_empty_trajectory(self):
+        labels = broni.regions(broni.Trajectory([] * km, [] * km, [] * km, [], 'gse'),
+                               {'a': Cuboid(*(0, 0, 0, 2, 2, 2) * km)})
+        self.assertEqual(len(labels.codes), 0)
+        self.assertEqual(labels.timeline(), [])
+
+    @data(
+        (1, np.uint8), (8, np.uint8), (9, np.uint16), (33, np.uint64),
+    )
+    @unpack
+    def test_code_dtype_depends_on_region_count(self, count, dtype):
+        labels = broni.regions(broni.Trajectory([0] * km, [0] * km, [0] * km, [0], 'gse'),
+                               {str(i): [] for i in range(count)})
+        self.assertEqual(labels.codes.dtype, dtype)
+
+    def test_overlapping_regions(self):
+        td = np.array([[-1, -1, -1], [0, 0, 0], [1, 1, 1], [1.5, 1.5, 1.5], [3, 3, 3], [1, 1, 1]]) * km
+        cuboid = Cuboid(*(0, 0, 0, 2, 2, 2) * km)
+
+        labels = broni.regions(
+            broni.Trajectory(td[:, 0], td[:, 1], td[:, 2], np.arange(100, 106), 'gse'),
+            {'box': cuboid,
+             'ball': Sphere(*(1.5, 1.5, 1.5, 1) * km),
+             'both': [cuboid, Sphere(*(1.5, 1.5, 1.5, 1) * km)]})
+
+        np.testing.assert_array_equal(labels.codes, [0, 1, 7, 7, 0, 7])
+        np.testing.assert_array_equal(labels.mask('box'), [False, True, True, True, False, True])
+        self.assertEqual(labels.timeline(),
+                         [(100, 100, ()),
+                          (101, 101, ('box',)),
+                          (102, 103, ('box', 'ball', 'both')),
+                          (104, 104, ()),
+                          (105, 105, ('box', 'ball', 'both'))])
+
+    def test_mask_of_unknown_region(self):
+        labels = broni.regions(broni.Trajectory([0] * km, [0] * km, [0] * km, [0], 'gse'), {'a': []})
+        with self.assertRaises(ValueError):
+            labels.mask('b')
+
+    def test_shared_masks_are_kept_until_their_last_use(self):
+        trajectory = broni.Trajectory([0, 1, 5] * km, [0, 1, 5] * km, [0, 1, 5] * km, [0, 1, 2], 'gse')
+        shared, single, empty = Cuboid(*(0, 0, 0, 2, 2, 2) * km), Sphere(*(0, 0, 0, 1) * km), Sphere(*(9, 9, 9, 1) * km)
+        shape_lists = [[shared, single], [empty, shared], [shared]]
+
+        cache = broni._MaskCache(shape_lists)
+        masks = []
+        for shape_list, kept in zip(shape_lists, [[id(shared)], [id(shared)], []]):
+            masks.append(broni._intersect_all(trajectory, shape_list, cache))
+            self.assertEqual(list(cache._masks), kept)
+
+        # the shared shape is skipped for the second list (no point left after the empty one) but still counted
+        np.testing.assert_array_equal(masks[0], [True, False, False])
+        np.testing.assert_array_equal(masks[1], [False, False, False])
+        np.testing.assert_array_equal(masks[2], [True, True, False])
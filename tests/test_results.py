@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+import os
+import tempfile
+import unittest
+from ddt import ddt, data, unpack
+
+import numpy as np
+from astropy.units import km
+
+import broni
+from broni.shapes.primitives import Cuboid
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+def _table(trajectory, time):
+    td = np.array(trajectory) * km
+    return broni.interval_table(broni.Trajectory(td[:, 0], td[:, 1], td[:, 2], time, 'gse'),
+                                Cuboid(*(0, 0, 0, 2, 2, 2) * km))
+
+
+TRAJECTORY = [[-1, -1, -1], [0, 0, 0], [1, 1, 1], [3, 3, 3], [1, 1, 1], [0, 0, 0], [3, 3, 3]]
+
+
+@ddt
+class TestIntervals(unittest.TestCase):
+    def test_columns(self):
+        table = _table(TRAJECTORY, np.arange(1000, 1007))
+
+        self.assertEqual(len(table), 2)
+        np.testing.assert_array_equal(table.start_index, [1, 4])
+        np.testing.assert_array_equal(table.stop_index, [2, 5])
+        np.testing.assert_array_equal(table.start, [1001, 1004])
+        np.testing.assert_array_equal(table.stop, [1002, 1005])
+        np.testing.assert_array_equal(table.duration, [1, 1])
+        self.assertEqual(table.to_list(), [(1001, 1002), (1004, 1005)])
+
+    def test_empty(self):
+        table = _table(TRAJECTORY[:1], [0])
+        self.assertEqual(len(table), 0)
+        self.assertEqual(table.add_statistic('x', [1]).statistics['x'].shape, (0,))
+        self.assertEqual(table.to_numpy().shape, (0,))
+
+    @data(
+        ('sum', [3, 9]),
+        ('mean', [1.5, 4.5]),
+        ('min', [1, 4]),
+        ('max', [2, 5]),
+        (np.multiply, [2, 20]),
+    )
+    @unpack
+    def test_statistics(self, reducer, expected):
+        table = _table(TRAJECTORY, np.arange(7)).add_statistic('value', np.arange(7), reducer)
+        np.testing.assert_array_equal(table.statistics['value'], expected)
+
+    def test_statistics_of_interval_at_the_end(self):
+        table = _table(TRAJECTORY[:-1], np.arange(6)).add_statistic('value', np.arange(6), 'sum')
+        np.testing.assert_array_equal(table.statistics['value'], [3, 9])
+
+    def test_statistics_invalid_args(self):
+        table = _table(TRAJECTORY, np.arange(7))
+        with self.assertRaises(ValueError):
+            table.add_statistic('start', np.arange(7))
+        with self.assertRaises(ValueError):
+            table.add_statistic('value', np.arange(7), 'median')
+
+    def test_to_numpy(self):
+        array = _table(TRAJECTORY, np.arange(7)).add_statistic('value', np.arange(7), 'max').to_numpy()
+
+        self.assertEqual(array.dtype.names, ('start_index', 'stop_index', 'start', 'stop', 'duration', 'value'))
+        np.testing.assert_array_equal(array['stop'], [2, 5])
+        np.testing.assert_array_equal(array['value'], [2, 5])
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_to_arrow_and_parquet(self):
+        time = np.datetime64('2020-01-01', 'ns') + np.arange(7) * np.timedelta64(1, 's')
+        table = _table(TRAJECTORY, time)
+
+        arrow = table.to_arrow()
+        self.assertEqual(arrow.num_rows, 2)
+        np.testing.assert_array_equal(arrow.column('start').to_numpy(), table.start)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'intervals.parquet')
+            table.to_parquet(path)
+            np.testing.assert_array_equal(pyarrow.parquet.read_table(path).column('duration').to_numpy(),
+                                          table.duration)
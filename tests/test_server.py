@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+
+import unittest
+
+import asyncio
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+import broni
+from broni.shapes.spec import from_spec
+
+# the server shares the trajectories with multiprocessing.shared_memory (Python 3.8)
+SERVER_SUPPORTED = sys.version_info >= (3, 8)
+if SERVER_SUPPORTED:
+    from broni.server import QueryServer, Client, SharedTrajectory, _attach, _detach, _query, _ATTACHED, _UNCLOSED
+
+R_EARTH = 6378.1
+
+SPHERE = {'type': 'sphere', 'center': [6 * R_EARTH, 10.4 * R_EARTH, 0], 'radius': 3 * R_EARTH}
+BOUNDARY = {'type': 'boundary', 'model': 'shue97', 'lower_bound': -R_EARTH, 'upper_bound': R_EARTH}
+
+
+def orbit(n=20000, dtype=np.float64):
+    phase = np.linspace(0, 20 * np.pi, n)
+    x, y = 12 * R_EARTH * np.cos(phase), 12 * R_EARTH * np.sin(phase)
+    time = np.datetime64('2020-01-01') + np.arange(n) * np.timedelta64(1, 'm')
+    return broni.Trajectory(x, y, np.zeros(n), time, 'gse', dtype=dtype)
+
+
+def expected(trajectory, specs, start=None, stop=None):
+    found = broni.interval_table(trajectory, [from_spec(spec) for spec in specs], start, stop)
+    return [[str(start), str(stop)] for start, stop in zip(found.start, found.stop)]
+
+
+@unittest.skipUnless(SERVER_SUPPORTED, "The query server requires Python 3.8.")
+class TestSharedTrajectory(unittest.TestCase):
+    def test_attach_shares_positions_and_derived_data(self):
+        trajectory = orbit(dtype=np.float32)
+        shared = SharedTrajectory(trajectory)
+        try:
+            attached = _attach(shared.descriptor)
+            self.assertIs(_attach(shared.descriptor), attached)
+
+            self.assertEqual(attached.dtype, np.float32)
+            self.assertEqual(attached.coordinate_system, 'gse')
+            np.testing.assert_array_equal(attached._cartesian, trajectory._cartesian_km())
+            np.testing.assert_array_equal(attached.time_index, trajectory.time_index)
+            for a, b in zip(attached._spherical_km(), trajectory._spherical_km()):
+                self.assertFalse(a.flags.writeable)
+                np.testing.assert_array_equal(a, b)
+
+            # no copy of the positions for reduced precision trajectories
+            self.assertFalse(attached._cartesian_km().flags.writeable)
+            self.assertTrue(np.shares_memory(attached.x, attached._cartesian))
+            self.assertEqual(attached.r.dtype, np.float32)
+        finally:
+            _detach(set())
+            shared.close()
+
+    def test_removed_trajectories_are_detached(self):
+        first, second = SharedTrajectory(orbit()), SharedTrajectory(orbit())
+        try:
+            _query(first.descriptor, [SPHERE], None, None, (first.descriptor[0],))
+            self.assertIn(first.descriptor[0], _ATTACHED)
+
+            _query(second.descriptor, [SPHERE], None, None, (second.descriptor[0],))
+            self.assertNotIn(first.descriptor[0], _ATTACHED)
+            self.assertIn(second.descriptor[0], _ATTACHED)
+
+            _query(first.descriptor, [SPHERE], None, None, (first.descriptor[0],))
+            self.assertEqual(list(_ATTACHED), [first.descriptor[0]])
+        finally:
+            _detach(set())
+            for shared in (first, second):
+                shared.close()
+
+    def test_object_time_index_is_rejected(self):
+        trajectory = broni.Trajectory([0.], [0.], [0.], np.array([object()]), 'gse')
+        with self.assertRaises(ValueError):
+            SharedTrajectory(trajectory)
+
+
+@unittest.skipUnless(SERVER_SUPPORTED, "The query server requires Python 3.8.")
+class TestQueryServer(unittest.TestCase):
+    def run_queries(self, server, *requests):
+        async def main():
+            return await asyncio.gather(*[server.query(request) for request in requests])
+
+        return asyncio.run(main())
+
+    def test_query_in_process(self):
+        trajectory = orbit()
+        with QueryServer(workers=0) as server:
+            server.add_trajectory('orbit', trajectory)
+
+            result, = self.run_queries(server, {'trajectory': 'orbit', 'shapes': [SPHERE, BOUNDARY]})
+            self.assertGreater(len(result['intervals']), 0)
+            self.assertEqual(result['intervals'], expected(trajectory, [SPHERE, BOUNDARY]))
+
+    def test_query_on_worker_processes(self):
+        trajectory = orbit()
+        with QueryServer(workers=1) as server:
+            server.add_trajectory('orbit', trajectory)
+
+            result, = self.run_queries(server, {'trajectory': 'orbit', 'shapes': SPHERE,
+                                                'start': '2020-01-02', 'stop': '2020-01-05'})
+            self.assertGreater(len(result['intervals']), 0)
+            self.assertEqual(result['intervals'], expected(trajectory, [SPHERE], '2020-01-02', '2020-01-05'))
+
+    def test_worker_server_keeps_one_copy(self):
+        trajectory = orbit(dtype=np.float32)
+        with QueryServer(workers=1) as server:
+            server.add_trajectory('orbit', trajectory)
+
+            resident = server._trajectories['orbit']
+            self.assertIs(resident, server._shared['orbit'].trajectory)
+            self.assertEqual(resident.dtype, np.float32)
+            self.assertFalse(np.shares_memory(resident._cartesian, trajectory._cartesian))
+            self.assertFalse(resident._cartesian.flags.writeable)
+
+            result, = self.run_queries(server, {'trajectory': 'orbit', 'shapes': [SPHERE]})
+            self.assertEqual(result['intervals'], expected(trajectory, [SPHERE]))
+
+            # the block stays mapped while the trajectory is referenced, it is closed later
+            server.remove_trajectory('orbit')
+            self.assertEqual(server.trajectories, [])
+            np.testing.assert_array_equal(resident._cartesian, trajectory._cartesian)
+            self.assertEqual(len(_UNCLOSED), 1)
+
+            del resident
+            server.add_trajectory('orbit', trajectory)
+            server.remove_trajectory('orbit')
+            self.assertEqual(len(_UNCLOSED), 0)
+
+    def test_identical_requests_are_computed_once(self):
+        with QueryServer(workers=0) as server:
+            server.add_trajectory('orbit', orbit())
+
+            request = {'trajectory': 'orbit', 'shapes': [SPHERE]}
+            results = self.run_queries(server, request, dict(request), {'shapes': [SPHERE], 'trajectory': 'orbit'})
+            self.assertEqual(results[0], results[1])
+            self.assertEqual(results[0], results[2])
+            self.assertEqual(server.statistics, {'requests': 3, 'cache_hits': 0, 'batched': 2, 'computed': 1})
+
+            self.run_queries(server, request, {'trajectory': 'orbit', 'shapes': [BOUNDARY]})
+            self.assertEqual(server.statistics, {'requests': 5, 'cache_hits': 1, 'batched': 2, 'computed': 2})
+
+    def test_replacing_a_trajectory_invalidates_its_results(self):
+        with QueryServer(workers=0) as server:
+            server.add_trajectory('orbit', orbit())
+            request = {'trajectory': 'orbit', 'shapes': [SPHERE]}
+            self.run_queries(server, request)
+
+            server.add_trajectory('orbit', orbit(10000))
+            result, = self.run_queries(server, request)
+            self.assertEqual(server.statistics['computed'], 2)
+            self.assertEqual(result['intervals'], expected(orbit(10000), [SPHERE]))
+
+    def test_invalid_requests(self):
+        with QueryServer(workers=0) as server:
+            server.add_trajectory('orbit', orbit())
+            for request in ({'op': 'unknown'},
+                            {'trajectory': 'unknown', 'shapes': [SPHERE]},
+                            {'trajectory': 'orbit', 'shapes': [{'type': 'unknown'}]}):
+                with self.assertRaises(ValueError):
+                    self.run_queries(server, request)
+
+    def test_unix_socket(self):
+        trajectory = orbit()
+
+        async def main(path):
+            with QueryServer(workers=0) as server:
+                server.add_trajectory('orbit', trajectory)
+                async with await server.serve(path):
+                    def client():
+                        with Client(path) as c:
+                            with self.assertRaises(ValueError):
+                                c.query({'trajectory': 'unknown'})
+                            return c.query({'op': 'trajectories'}), c.intervals('orbit', [SPHERE, BOUNDARY])
+
+                    return await asyncio.get_running_loop().run_in_executor(None, client)
+
+        with tempfile.TemporaryDirectory() as directory:
+            listing, found = asyncio.run(main(os.path.join(directory, 'broni.sock')))
+
+        self.assertEqual(listing, {'trajectories': ['orbit']})
+        self.assertEqual(found, [tuple(interval) for interval in expected(trajectory, [SPHERE, BOUNDARY])])
+
+    def test_failing_specifications_are_reported(self):
+        async def main(path):
+            with QueryServer(workers=0) as server:
+                server.add_trajectory('orbit', orbit())
+                async with await server.serve(path):
+                    def client():
+                        errors = []
+                        with Client(path) as c:
+                            for spec in ({'type': 'boundary', 'model': 'shue97', 'parameters': {'pdyn': 0},
+                                          'lower_bound': -1},
+                                         {'type': 'mesh', 'vertices': [[0, 0, 0], [1, 0, 0], [0, 1, 0]],
+                                          'faces': [[0, 1, 5]]}):
+                                with self.assertRaises(ValueError) as e:
+                                    c.intervals('orbit', spec)
+                                errors.append(str(e.exception))
+                            # the connection is still usable
+                            errors.append(c.intervals('orbit', SPHERE))
+                        return errors
+
+                    return await asyncio.get_running_loop().run_in_executor(None, client)
+
+        with tempfile.TemporaryDirectory() as directory:
+            zero_division, index, found = asyncio.run(main(os.path.join(directory, 'broni.sock')))
+
+        self.assertTrue(zero_division.startswith('ZeroDivisionError'))
+        self.assertTrue(index.startswith('IndexError'))
+        self.assertGreater(len(found), 0)
+
+    def test_client_on_closed_connection(self):
+        async def main(path):
+            async def close(reader, writer):
+                await reader.readline()
+                writer.close()
+
+            async with await asyncio.start_unix_server(close, path):
+                def client():
+                    with Client(path) as c:
+                        with self.assertRaises(ConnectionError):
+                            c.query({'op': 'trajectories'})
+
+                await asyncio.get_running_loop().run_in_executor(None, client)
+
+        with tempfile.TemporaryDirectory() as directory:
+            asyncio.run(main(os.path.join(directory, 'broni.sock')))
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+import unittest
+from ddt import ddt, data
+
+import json
+import pickle
+import numpy as np
+
+import broni
+from broni.shapes.callback import SphericalBoundary, Sheath, NestedBoundaries
+from broni.shapes.collection import ShapeCollection
+from broni.shapes.mesh import MeshShape
+from broni.shapes.models import MODELS, register_model, get_model, model_name, shue97, conic_bow_shock
+from broni.shapes.primitives import Cuboid, Sphere
+from broni.shapes.spec import from_spec, to_spec
+
+R_EARTH = 6378.1
+
+
+def shapes():
+    vertices = np.array([[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=float) * 10 * R_EARTH
+    faces = np.array([(0, 1, 3), (0, 3, 2), (4, 6, 7), (4, 7, 5), (0, 4, 5), (0, 5, 1),
+                      (2, 3, 7), (2, 7, 6), (0, 2, 6), (0, 6, 4), (1, 5, 7), (1, 7, 3)])
+
+    return [
+        Sphere(10 * R_EARTH, 0, 0, 5 * R_EARTH, 'gse'),
+        Cuboid(5 * R_EARTH, -5 * R_EARTH, -5 * R_EARTH, 15 * R_EARTH, 5 * R_EARTH, 5 * R_EARTH),
+        SphericalBoundary(shue97, -R_EARTH, R_EARTH, pdyn=4),
+        SphericalBoundary(conic_bow_shock, None, R_EARTH),
+        Sheath(shue97, conic_bow_shock, 0, R_EARTH),
+        NestedBoundaries(shue97, conic_bow_shock, names=['magnetosphere', 'magnetosheath', 'solar wind'],
+                         region='magnetosheath'),
+        ShapeCollection([Sphere(x * R_EARTH, 0, 0, R_EARTH, 'gse') for x in range(-20, 20, 3)] +
+                        [Cuboid(x * R_EARTH, -500, -500, (x + 1) * R_EARTH, 500, 500, 'gse') for x in (-2, 7)]),
+        MeshShape(vertices - 5 * R_EARTH, faces, resolution=4),
+    ]
+
+
+def line(n=10000):
+    x = np.linspace(-30 * R_EARTH, 30 * R_EARTH, n)
+    return broni.Trajectory(x, np.full(n, 1000.), np.zeros(n), np.arange(n), 'gse')
+
+
+@ddt
+class TestModels(unittest.TestCase):
+    def test_shue97_default_stand_off(self):
+        r = shue97(np.zeros(1), np.zeros(1))[0]
+        self.assertAlmostEqual(r[0], 11.4 * 2 ** (-1 / 6.6))
+
+    def test_shue97_parameters(self):
+        self.assertAlmostEqual(shue97(np.zeros(1), np.zeros(1), r0=9, alpha=0.6)[0][0], 9)
+        self.assertLess(shue97(np.zeros(1), np.zeros(1), pdyn=10)[0][0], shue97(np.zeros(1), np.zeros(1))[0][0])
+
+    def test_conic_bow_shock_stand_off(self):
+        self.assertAlmostEqual(conic_bow_shock(np.zeros(1), np.zeros(1), r0=12)[0][0], 12)
+
+    def test_models_are_registered(self):
+        self.assertIs(get_model('shue97'), shue97)
+        self.assertIs(get_model('conic_bow_shock'), conic_bow_shock)
+
+    def test_unknown_model(self):
+        with self.assertRaises(ValueError):
+            get_model('unknown')
+
+    def test_register_model(self):
+        @register_model('test_sphere')
+        def model(lon, lat, r=10, **kwargs):
+            return np.full(np.shape(lon), r), lon, lat
+
+        try:
+            self.assertIs(get_model('test_sphere'), model)
+            with self.assertRaises(ValueError):
+                register_model('test_sphere', shue97)
+
+            shape = from_spec({'type': 'boundary', 'model': 'test_sphere', 'parameters': {'r': 20},
+                               'lower_bound': -1000, 'upper_bound': 1000})
+            found = broni.intervals(line(), shape)
+            self.assertEqual(len(found), 2)
+        finally:
+            del MODELS['test_sphere']
+
+
+@ddt
+class TestSpec(unittest.TestCase):
+    def test_sphere(self):
+        shape = from_spec({'type': 'sphere', 'center': [1, 2, 3], 'radius': 4, 'coordinate_system': 'gsm'})
+        self.assertIsInstance(shape, Sphere)
+        np.testing.assert_array_equal(shape._center, [1, 2, 3])
+        self.assertEqual(shape._radius, 4)
+        self.assertEqual(shape.coordinate_system, 'gsm')
+
+    def test_cuboid(self):
+        shape = from_spec({'type': 'cuboid', 'corners': [[0, 0, 0], [1, 2, 3]]})
+        self.assertIsInstance(shape, Cuboid)
+        np.testing.assert_array_equal(shape.bounding_box(), [[0, 0, 0], [1, 2, 3]])
+        self.assertIsNone(shape.coordinate_system)
+
+    def test_boundary_gives_the_same_intervals_as_the_model(self):
+        spec = {'type': 'boundary', 'model': 'shue97', 'parameters': {'pdyn': 4},
+                'lower_bound': -R_EARTH, 'upper_bound': R_EARTH}
+        expected = broni.intervals(line(), SphericalBoundary(shue97, -R_EARTH, R_EARTH, pdyn=4))
+
+        self.assertEqual(len(expected), 1)
+        self.assertEqual(broni.intervals(line(), from_spec(spec)), expected)
+        self.assertEqual(broni.intervals(line(), from_spec(json.dumps(spec))), expected)
+
+    @data({'type': 'unknown'},
+          {'center': [0, 0, 0], 'radius': 1},
+          [],
+          {'type': 'sphere', 'center': [0, 0, 0]},
+          {'type': 'cuboid'},
+          {'type': 'boundary', 'lower_bound': 1},
+          {'type': 'boundary', 'model': 'unknown', 'lower_bound': 1},
+          {'type': 'boundary', 'model': 'shue97'})
+    def test_invalid_specs(self, spec):
+        with self.assertRaises(ValueError):
+            from_spec(spec)
+
+    def test_sheath_and_nested(self):
+        sheath = from_spec({'type': 'sheath', 'inner': {'model': 'shue97'},
+                            'outer': {'model': 'conic_bow_shock', 'parameters': {'r0': 12}}, 'outer_margin': 100})
+        self.assertIsInstance(sheath, Sheath)
+        self.assertEqual(sheath.outer_model._upper, 100)
+        self.assertEqual(sheath.outer_model._cb.keywords, {'r0': 12, 'base': 'spherical'})
+
+        nested = from_spec({'type': 'nested', 'boundaries': [{'model': 'shue97'}, {'model': 'conic_bow_shock'}],
+                            'names': ['a', 'b', 'c'], 'region': 'b'})
+        self.assertIsInstance(nested, NestedBoundaries)
+        self.assertEqual(nested.region, 1)
+
+    @data(*shapes())
+    def test_spec_round_trip(self, shape):
+        spec = to_spec(shape)
+        rebuilt = from_spec(json.loads(json.dumps(spec)))
+
+        self.assertIs(type(rebuilt), type(shape))
+        self.assertEqual(to_spec(rebuilt), spec)
+        np.testing.assert_array_equal(rebuilt.intersect(line()), shape.intersect(line()))
+
+    def test_spec_of_unregistered_callback(self):
+        with self.assertRaises(ValueError):
+            to_spec(SphericalBoundary(lambda lon, lat, **kwargs: (np.ones(len(lon)), lon, lat), -1, 1))
+
+    @data(*shapes())
+    def test_pickle(self, shape):
+        rebuilt = pickle.loads(pickle.dumps(shape))
+        np.testing.assert_array_equal(rebuilt.intersect(line()), shape.intersect(line()))
+
+    def test_pickled_collection_keeps_its_grid_but_not_its_shapes(self):
+        collection = ShapeCollection([Sphere(x * R_EARTH, 0, 0, R_EARTH) for x in range(1000)])
+        payload = pickle.dumps(collection)
+        self.assertNotIn(b'Sphere', payload)
+
+        rebuilt = pickle.loads(payload)
+        np.testing.assert_array_equal(rebuilt._cell_keys, collection._cell_keys)
+        self.assertEqual(to_spec(rebuilt), to_spec(collection))
+
+    def test_model_name(self):
+        self.assertEqual(model_name(shue97), 'shue97')
+        self.assertIsNone(model_name(len))
@@ -1,10 +1,17 @@
 #!/usr/bin/env python
 
+import datetime
 import unittest
 from ddt import ddt, data, unpack
 
 import numpy as np
 from astropy.units import km
+from astropy.time import Time
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
 
 import broni
 from broni.shapes.primitives import Cuboid, Sphere
@@ -104,3 +111,121 @@ class TestTrajectory(unittest.TestCase):
                 broni.Trajectory(td[:, 0], td[:, 1], td[:, 2], time, 'gse'),
                 objects),
             np.array(expected))
+
+
+def _datetimes(count):
+    return [datetime.datetime(2020, 1, 1) + datetime.timedelta(minutes=i) for i in range(count)]
+
+
+@ddt
+class TestTrajectoryTimeIndex(unittest.TestCase):
+    def _trajectory(self, time):
+        return broni.Trajectory(*(np.zeros((3, len(time))) * km), time, 'gse')
+
+    @data(
+        _datetimes(3),
+        np.array(_datetimes(3), dtype='datetime64[s]'),
+        [d.replace(tzinfo=datetime.timezone(datetime.timedelta(hours=1))) + datetime.timedelta(hours=1)
+         for d in _datetimes(3)],
+    )
+    def test_datetimes_are_normalized_to_datetime64_ns(self, time):
+        trajectory = self._trajectory(time)
+
+        self.assertEqual(trajectory.time_index.dtype, np.dtype('datetime64[ns]'))
+        np.testing.assert_array_equal(trajectory.time_index, np.array(_datetimes(3), dtype='datetime64[ns]'))
+
+    @unittest.skipIf(pandas is None, "pandas is not installed")
+    def test_pandas_datetime_index(self):
+        trajectory = self._trajectory(pandas.date_range('2020-01-01', periods=3, freq='min', tz='UTC'))
+        np.testing.assert_array_equal(trajectory.time_index, np.array(_datetimes(3), dtype='datetime64[ns]'))
+
+    @unittest.skipIf(pandas is None, "pandas is not installed")
+    def test_pandas_series(self):
+        for time in (pandas.Series(pandas.date_range('2020-01-01', periods=3, freq='min')),
+                     pandas.Series(pandas.date_range('2020-01-01 01:00', periods=3, freq='min', tz='Europe/Paris')),
+                     pandas.DataFrame({'time': _datetimes(3)})['time']):
+            trajectory = self._trajectory(time)
+            np.testing.assert_array_equal(trajectory.time_index, np.array(_datetimes(3), dtype='datetime64[ns]'))
+
+        np.testing.assert_array_equal(self._trajectory(pandas.Series([1.5, 2.5, 3.5])).time_index, [1.5, 2.5, 3.5])
+
+    def test_astropy_time(self):
+        trajectory = self._trajectory(Time(_datetimes(3), scale='utc'))
+        np.testing.assert_array_equal(trajectory.time_index, np.array(_datetimes(3), dtype='datetime64[ns]'))
+
+    def test_numerical_time_index_is_kept(self):
+        np.testing.assert_array_equal(self._trajectory([1.5, 2.5]).time_index, [1.5, 2.5])
+
+    @data(
+        (None, None, (0, 10)),
+        (datetime.datetime(2020, 1, 1, 0, 2), None, (2, 10)),
+        (None, '2020-01-01T00:02', (0, 3)),
+        (np.datetime64('2020-01-01T00:02:30'), Time('2020-01-01T00:05', scale='utc'), (3, 6)),
+        ('2019-01-01', '2019-01-02', (0, 0)),
+        ('2020-01-01T00:05', '2020-01-01T00:04', (5, 5)),
+    )
+    @unpack
+    def test_index_range(self, start, stop, expected):
+        self.assertEqual(self._trajectory(_datetimes(10)).index_range(start, stop), expected)
+
+    def test_index_range_numerical_time_index(self):
+        self.assertEqual(self._trajectory(np.arange(10) * 10).index_range(15, 50), (2, 6))
+
+    def test_index_range_requires_sorted_time_index(self):
+        with self.assertRaises(ValueError):
+            self._trajectory([3, 2, 1]).index_range(1, 2)
+
+
+@ddt
+class TestTrajectoryViews(unittest.TestCase):
+    def setUp(self):
+        td = np.array([[-1, -1, -1], [0, 0, 0], [1, 1, 1], [3, 3, 3], [1, 1, 1], [0, 0, 0], [3, 3, 3]],
+                      dtype=float) * km
+        self.trajectory = broni.Trajectory(td[:, 0], td[:, 1], td[:, 2], np.arange(100, 107), 'gse')
+
+    def test_view_shares_buffers(self):
+        view = self.trajectory[2:5]
+
+        self.assertEqual(len(view), 3)
+        self.assertTrue(np.shares_memory(view.x, self.trajectory.x))
+        np.testing.assert_array_equal(view.time_index, [102, 103, 104])
+
+    def test_view_shares_derived_data_of_parent(self):
+        self.trajectory.r
+        self.trajectory.cartesian
+        view = self.trajectory[2:5][1:]
+
+        self.assertTrue(np.shares_memory(view.r, self.trajectory.r))
+        self.assertTrue(np.shares_memory(view.lon, self.trajectory.lon))
+        self.assertTrue(np.shares_memory(view.cartesian, self.trajectory.cartesian))
+        np.testing.assert_array_equal(view.cartesian, self.trajectory.cartesian[3:5])
+
+    def test_view_computes_derived_data_for_its_range(self):
+        view = self.trajectory[2:5]
+
+        np.testing.assert_array_equal(view.r, self.trajectory.r[2:5])
+        self.assertFalse(np.shares_memory(view.r, self.trajectory.r))
+
+    def test_only_slices_are_supported(self):
+        with self.assertRaises(TypeError):
+            assert self.trajectory[1]
+
+    def test_between(self):
+        np.testing.assert_array_equal(self.trajectory.between(102, 104.5).time_index, [102, 103, 104])
+
+    @data(
+        (None, None, [(101, 102), (104, 105)]),
+        (102, None, [(102, 102), (104, 105)]),
+        (None, 104, [(101, 102), (104, 104)]),
+        (103, 103, []),
+        (200, None, []),
+    )
+    @unpack
+    def test_intervals_in_time_range(self, start, stop, expected):
+        self.assertEqual(broni.intervals(self.trajectory, Cuboid(*(0, 0, 0, 2, 2, 2) * km), start=start, stop=stop),
+                         expected)
+
+    def test_interval_table_indices_refer_to_the_trajectory(self):
+        table = broni.interval_table(self.trajectory, Cuboid(*(0, 0, 0, 2, 2, 2) * km), start=103)
+        np.testing.assert_array_equal(table.start_index, [4])
+        np.testing.assert_array_equal(table.stop_index, [5])